@@ -0,0 +1,210 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import subprocess
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+# Make src/ importable when run as a script
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import create_engine, text
+
+import schema
+import metrics
+import data_version
+import dataset
+import transform
+import analyze
+import backends
+import validate
+from synthetic import generate, currencies as synthetic_currencies
+from dataset import read_rates
+from load import load_to_db
+from analytics import stats_from_frame, build_report
+from forecasting import load_series, forecast_all
+from charts import render_charts
+
+RESULTS_DIR = ROOT / "bench" / "results"
+
+# SQLite stand-ins for exchange_rates and its change feed (PostgreSQL uses sql/create_tables.sql)
+SQLITE_DDL = ["""
+CREATE TABLE exchange_rates (
+    cc VARCHAR(10) NOT NULL, txt VARCHAR(100), rate NUMERIC, rate_per_100 NUMERIC,
+    exchangedate DATE NOT NULL, PRIMARY KEY (cc, exchangedate)
+)
+""", """
+CREATE TABLE rate_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, cc VARCHAR(10) NOT NULL, exchangedate DATE NOT NULL,
+    op VARCHAR(6) NOT NULL, old_rate NUMERIC, rate NUMERIC, changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""]
+
+
+def measure(results, name, fn, **extra):
+    # Run one stage under tracemalloc; records wall time and peak Python heap
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        out = fn()
+    finally:
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    rows = extra.pop("rows", None)
+    results[name] = {"seconds": round(seconds, 4), "peak_mb": round(peak / 2 ** 20, 2),
+                     "rows": rows(out) if callable(rows) else rows, **extra}
+    print(f"+ {name:<10} {seconds:8.3f}s  peak {peak / 2 ** 20:8.1f} MB")
+    return out
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "src"))}
+
+
+def prepare_db(engine):
+    # Fresh tables so runs are comparable; PostgreSQL must be a scratch database
+    if engine.dialect.name == "postgresql":
+        if not schema.SCHEMA_SQL.exists():
+            schema.SCHEMA_SQL = ROOT / "sql" / "create_tables.sql"
+        schema.ensure_schema(engine)
+        with engine.begin() as conn:
+            conn.execute(text("TRUNCATE exchange_rates, currency_daily_stats, rate_changes, change_feed_cursors"))
+    else:
+        with engine.begin() as conn:
+            for table in ("exchange_rates", "rate_changes"):
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+            for ddl in SQLITE_DDL:
+                conn.execute(text(ddl))
+
+
+def collect_report(engine, ccys):
+    if engine.dialect.name == "postgresql" or backends.BACKEND != "postgres":
+        return analyze.collect_report(engine, ccys)
+    # STATS_SQL is PostgreSQL-only; the SQLite stand-in computes the same metrics in pandas
+    with engine.connect() as conn:
+        df = pd.read_sql(text("SELECT cc, exchangedate, rate FROM exchange_rates"), conn)
+    df["exchangedate"] = pd.to_datetime(df["exchangedate"])
+    df["rate"] = df["rate"].astype(float)
+    stats, num_currencies = stats_from_frame(df, ccys, analyze.HORIZON, analyze.RANGE_DAYS)
+    return build_report(stats, num_currencies, ccys)
+
+
+def run(n_currencies, n_days, db_url=None, workdir=None, model="rolling"):
+    work = Path(workdir or tempfile.mkdtemp(prefix="currency-bench-"))
+    raw_dir, processed_dir = work / "raw", work / "processed"
+    # Point the stages at the scratch directories
+    transform.RAW_DIR = raw_dir
+    transform.PROCESSED_DIR = processed_dir
+    transform.MANIFEST_PATH = processed_dir / "manifest.json"
+    dataset.DATASET_DIR = transform.DATASET_DIR = processed_dir / "rates"
+    validate.QUARANTINE_DIR = processed_dir / "quarantine"
+    metrics.TEXTFILE = str(work / "metrics.prom")
+    data_version.VERSION_FILE = work / "data_version"
+    ccys = [c[1] for c in synthetic_currencies(n_currencies)]
+    transform.CURRENCIES = ccys
+
+    engine = create_engine(db_url or f"sqlite:///{work / 'bench.db'}")
+    stages = {}
+    try:
+        started = time.perf_counter()
+        generate(raw_dir, n_currencies, n_days)
+        print(f"+ Generated {n_days} snapshots x {n_currencies} currencies in {time.perf_counter() - started:.2f}s")
+
+        measure(stages, "transform", transform.transform_incremental, rows=lambda n: n)
+        df = read_rates()
+
+        # Whole history re-checked as one batch against everything stored (scan not timed)
+        full = pa.Table.from_pandas(df.assign(exchangedate=df["exchangedate"].dt.date)[validate.SCHEMA.names],
+                                    schema=validate.SCHEMA, preserve_index=False)
+        stored = dataset.scan_rates(columns=["rate"])
+        measure(stages, "validate", lambda: validate.validate(full, stored=stored), rows=len(full))
+
+        prepare_db(engine)
+        measure(stages, "load_to_db", lambda: load_to_db(df, engine), rows=len(df), backend=engine.dialect.name)
+        # Same rows again: nothing differs, so nothing should be written
+        measure(stages, "reload_to_db", lambda: load_to_db(df, engine), rows=len(df), backend=engine.dialect.name)
+
+        report = measure(stages, "analyze", lambda: collect_report(engine, ccys), rows=len(ccys))
+
+        def forecast():
+            with engine.connect() as conn:
+                series = load_series(conn, ccys, lookback_days=n_days + 1)
+            return forecast_all(series, model=model)
+        history, future = measure(stages, "forecast", forecast, rows=lambda out: len(out[0]), model=model)
+        measure(stages, "charts", lambda: render_charts(history, future, work / "charts", ccys), rows=len(ccys))
+
+        measure(stages, "report", lambda: analyze.save_reports(
+            report, analyze.format_text(report, ccys), reports_dir=work / "reports"), rows=len(ccys))
+    finally:
+        engine.dispose()
+        if workdir is None:
+            shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        **git_info(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {"currencies": n_currencies, "days": n_days, "rows": n_currencies * n_days,
+                   "backend": engine.dialect.name},
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": stages,
+    }
+
+
+def compare(result, baseline_path):
+    # Print per-stage time/memory ratios against a previous result file
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    if base["params"] != result["params"]:
+        print(f"# Baseline params differ: {base['params']}")
+    print(f"+ vs {base.get('commit')} ({baseline_path})")
+    for name, cur in result["stages"].items():
+        old = base["stages"].get(name)
+        if not old:
+            continue
+        t = cur["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        m = cur["peak_mb"] / old["peak_mb"] if old["peak_mb"] else float("nan")
+        print(f"  {name:<10} time x{t:5.2f}  memory x{m:5.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic NBU data")
+    parser.add_argument("--currencies", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="scratch PostgreSQL database (tables are truncated); default: temporary SQLite")
+    parser.add_argument("--model", default="rolling")
+    parser.add_argument("--workdir", help="keep generated files here instead of a temp dir")
+    parser.add_argument("--out", type=Path, help="result file (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run(args.currencies, args.days, args.db_url, args.workdir, args.model)
+    out = args.out or RESULTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{result['commit'] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"+ Results saved to {out}")
+    if args.compare:
+        compare(result, args.compare)
@@ -0,0 +1,65 @@
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+from datetime import date, timedelta
+
+# Make src/ importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from ingest import write_raw, raw_name
+
+# A few real NBU entries first, then made-up codes to reach any N
+REAL = [
+    (840, "USD", "Долар США", 41.0), (978, "EUR", "Євро", 45.0), (985, "PLN", "Злотий", 10.5),
+    (826, "GBP", "Фунт стерлінгів", 52.0), (756, "CHF", "Швейцарський франк", 47.0),
+    (392, "JPY", "Єна", 0.27), (156, "CNY", "Юань Женьміньбі", 5.7), (203, "CZK", "Чеська крона", 1.8),
+    (208, "DKK", "Данська крона", 6.0), (348, "HUF", "Форинт", 0.11), (578, "NOK", "Норвезька крона", 3.8),
+    (752, "SEK", "Шведська крона", 3.9), (124, "CAD", "Канадський долар", 30.0), (36, "AUD", "Австралійський долар", 27.0),
+]
+
+
+def currencies(n):
+    # [(r030, cc, txt, base_rate)] for n currencies
+    out = REAL[:n]
+    for i in range(len(out), n):
+        # Three-letter codes (XAO, XAP, ..., then Y.., Z..) like real ISO 4217 ones
+        cc = "XYZ"[i // 676] + chr(65 + i // 26 % 26) + chr(65 + i % 26)
+        out.append((1000 + i, cc, f"Валюта {i}", 1.0 + i % 50))
+    return out
+
+
+def generate(raw_dir, n_currencies=40, n_days=365, end=None, seed=42, compression=None):
+    # Write one NBU-shaped snapshot per day (random-walk rates) under raw_dir/<date>/.
+    # Returns the list of written files.
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    start = end - timedelta(days=n_days - 1)
+    ccys = currencies(n_currencies)
+    base = np.array([c[3] for c in ccys])
+    # Daily log-returns of ~0.3% give realistic looking series
+    walk = base * np.exp(np.cumsum(rng.normal(0, 0.003, size=(n_days, len(ccys))), axis=0))
+
+    files = []
+    for i in range(n_days):
+        day = start + timedelta(days=i)
+        stamp = day.strftime("%d.%m.%Y")
+        data = [{"r030": r030, "txt": txt, "rate": round(float(walk[i, j]), 4), "cc": cc, "exchangedate": stamp}
+                for j, (r030, cc, txt, _) in enumerate(ccys)]
+        out_dir = Path(raw_dir) / day.strftime("%Y-%m-%d")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / raw_name(compression)
+        write_raw(data, path)
+        files.append(path)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic NBU raw snapshots")
+    parser.add_argument("raw_dir")
+    parser.add_argument("--currencies", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    files = generate(args.raw_dir, args.currencies, args.days, seed=args.seed)
+    print(f"+ Generated {len(files)} snapshots x {args.currencies} currencies in {args.raw_dir}")
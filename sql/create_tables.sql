@@ -1,13 +1,65 @@
+-- Migration from the original unpartitioned table: move it aside so the
+-- partitioned table can take its name (no-op once migrated or on a fresh install)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class
+               WHERE relname = 'exchange_rates' AND relkind = 'r'
+                 AND relnamespace = current_schema()::regnamespace) THEN
+        ALTER TABLE exchange_rates RENAME TO exchange_rates_legacy;
+        -- free the constraint index names for the new table
+        ALTER INDEX IF EXISTS exchange_rates_pkey RENAME TO exchange_rates_legacy_pkey;
+        ALTER INDEX IF EXISTS exchange_rates_cc_exchangedate_key RENAME TO exchange_rates_legacy_cc_exchangedate_key;
+    END IF;
+END $$;
+
+-- Rates partitioned by year; the partition key is part of the primary key
 CREATE TABLE IF NOT EXISTS exchange_rates (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     cc VARCHAR(10) NOT NULL,
     txt VARCHAR(100),
-    rate NUMERIC,
-    rate_per_100 NUMERIC,
+    rate NUMERIC(18, 6),
+    rate_per_100 NUMERIC(20, 6),
     exchangedate DATE NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
-    UNIQUE (cc, exchangedate)
-);
+    PRIMARY KEY (cc, exchangedate)
+) PARTITION BY RANGE (exchangedate);
+
+-- Create the yearly partition exchange_rates_<year> if missing
+CREATE OR REPLACE FUNCTION ensure_exchange_rates_partition(p_year INTEGER) RETURNS VOID AS $$
+BEGIN
+    EXECUTE 'CREATE TABLE IF NOT EXISTS ' || quote_ident('exchange_rates_' || p_year)
+        || ' PARTITION OF exchange_rates FOR VALUES FROM ('
+        || quote_literal(make_date(p_year, 1, 1)) || ') TO ('
+        || quote_literal(make_date(p_year + 1, 1, 1)) || ')';
+END $$ LANGUAGE plpgsql;
+
+-- NBU history starts in 1996; keep one spare year ahead
+DO $$
+BEGIN
+    FOR y IN 1996..EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + 1 LOOP
+        PERFORM ensure_exchange_rates_partition(y);
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS exchange_rates_default PARTITION OF exchange_rates DEFAULT;
+
+-- "Latest rate per cc" and "range over last N days per cc": index-only scans
+CREATE INDEX IF NOT EXISTS exchange_rates_cc_date_desc_idx
+    ON exchange_rates (cc, exchangedate DESC) INCLUDE (rate);
+-- Cross-currency date ranges (e.g. all rates of the last N days)
+CREATE INDEX IF NOT EXISTS exchange_rates_date_idx
+    ON exchange_rates (exchangedate) INCLUDE (cc, rate);
+
+-- Copy legacy rows into the partitioned table, then drop the old table
+DO $$
+BEGIN
+    IF to_regclass('exchange_rates_legacy') IS NOT NULL THEN
+        INSERT INTO exchange_rates (cc, txt, rate, rate_per_100, exchangedate, created_at)
+        SELECT cc, txt, rate, rate_per_100, exchangedate, created_at FROM exchange_rates_legacy
+        ON CONFLICT (cc, exchangedate) DO NOTHING;
+        DROP TABLE exchange_rates_legacy;
+    END IF;
+END $$;
 
 CREATE TABLE IF NOT EXISTS telegram_users (
     chat_id BIGINT PRIMARY KEY,
@@ -16,3 +68,66 @@ CREATE TABLE IF NOT EXISTS telegram_users (
     last_name TEXT,
     joined_at TIMESTAMP DEFAULT now()
 );
+
+-- Per-currency daily summary maintained incrementally by the load stage
+CREATE TABLE IF NOT EXISTS currency_daily_stats (
+    cc VARCHAR(10) NOT NULL,
+    exchangedate DATE NOT NULL,
+    rate NUMERIC(18, 6),
+    cum_sum NUMERIC(28, 6) NOT NULL,
+    cum_count INTEGER NOT NULL,
+    avg_7 NUMERIC(18, 6),
+    avg_30 NUMERIC(18, 6),
+    avg_365 NUMERIC(18, 6),
+    min_365 NUMERIC(18, 6),
+    max_365 NUMERIC(18, 6),
+    change_30 NUMERIC(18, 6),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (cc, exchangedate)
+);
+
+-- Per-chat threshold alerts registered through the bot (/alert USD > 42.5, /alert EUR move 1%).
+-- above/below: threshold is a rate in UAH; move: threshold is a day-over-day change in percent
+CREATE TABLE IF NOT EXISTS alerts (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    cc VARCHAR(10) NOT NULL,
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('above', 'below', 'move')),
+    threshold NUMERIC(18, 6) NOT NULL CHECK (threshold > 0),
+    created_at TIMESTAMP DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS alerts_cc_idx ON alerts (cc);
+CREATE INDEX IF NOT EXISTS alerts_chat_idx ON alerts (chat_id);
+
+-- Triggered alerts waiting for (or done with) batched delivery; one row per alert and rate date
+CREATE TABLE IF NOT EXISTS alert_queue (
+    id BIGSERIAL PRIMARY KEY,
+    alert_id BIGINT NOT NULL REFERENCES alerts (id) ON DELETE CASCADE,
+    chat_id BIGINT NOT NULL,
+    exchangedate DATE NOT NULL,
+    message TEXT NOT NULL,
+    queued_at TIMESTAMP DEFAULT now(),
+    sent_at TIMESTAMP,
+    UNIQUE (alert_id, exchangedate)
+);
+CREATE INDEX IF NOT EXISTS alert_queue_pending_idx ON alert_queue (id) WHERE sent_at IS NULL;
+
+-- Change feed: one row per exchange_rates row a load actually inserted or updated
+-- (identical reruns write nothing). Consumers read it past their cursor.
+CREATE TABLE IF NOT EXISTS rate_changes (
+    id BIGSERIAL PRIMARY KEY,
+    cc VARCHAR(10) NOT NULL,
+    exchangedate DATE NOT NULL,
+    op VARCHAR(6) NOT NULL CHECK (op IN ('insert', 'update')),
+    old_rate NUMERIC(18, 6),
+    rate NUMERIC(18, 6),
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS rate_changes_changed_at_idx ON rate_changes (changed_at);
+
+-- Last rate_changes.id each downstream consumer (gaps, cross_rates, analyze, ...) has processed
+CREATE TABLE IF NOT EXISTS change_feed_cursors (
+    consumer VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
@@ -1,5 +1,11 @@
-import pyarrow.parquet as pq
+import sys
+from pathlib import Path
 
-table = pq.read_table(r"D:\Projects\Python\etl-currency\data\processed\2025-09-14\data.parquet")
-df = table.to_pandas()
+# Make src/ importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataset import read_rates
+
+# Predicate-pushdown scan: only cc=USD partitions for the selected months are read
+df = read_rates(currencies=["USD"], start="2025-09-01")
 print(df.head())
@@ -0,0 +1,194 @@
+import os
+import math
+import time
+import asyncio
+from bisect import bisect_left, bisect_right
+from sqlalchemy import text
+import metrics
+
+# Alerts one chat may hold
+MAX_PER_CHAT = int(os.getenv("ALERTS_PER_CHAT", "20"))
+# Queued alerts sent per delivery run
+DELIVERY_BATCH = int(os.getenv("ALERTS_DELIVERY_BATCH", "5000"))
+
+# "/alert USD > 42.5" operators -> alerts.kind
+OPERATORS = {">": "above", "<": "below", "move": "move", "%": "move"}
+# alerts.threshold is NUMERIC(18, 6): rates stay below 10^12; moves are at most 100%
+MAX_THRESHOLD = 10 ** 12
+MAX_MOVE = 100
+
+ACTIVE_SQL = text("SELECT id, chat_id, cc, kind, threshold FROM alerts WHERE cc = ANY(:ccs)")
+
+# Per currency: latest rate, the observation before it (daily move) and the last rate known
+# before this load (crossings); only currencies whose latest date was part of the load
+MOVES_SQL = text("""
+    SELECT c.cc, l.exchangedate, l.rate, p.rate AS prev_rate, b.rate AS base_rate
+    FROM unnest(CAST(:ccs AS TEXT[]), CAST(:since AS DATE[])) AS c(cc, since)
+    CROSS JOIN LATERAL (
+        SELECT exchangedate, rate FROM exchange_rates
+        WHERE cc = c.cc ORDER BY exchangedate DESC LIMIT 1
+    ) l
+    LEFT JOIN LATERAL (
+        SELECT rate FROM exchange_rates
+        WHERE cc = c.cc AND exchangedate < l.exchangedate ORDER BY exchangedate DESC LIMIT 1
+    ) p ON true
+    LEFT JOIN LATERAL (
+        SELECT rate FROM exchange_rates
+        WHERE cc = c.cc AND exchangedate < c.since ORDER BY exchangedate DESC LIMIT 1
+    ) b ON true
+    WHERE l.exchangedate >= c.since
+""")
+
+ENQUEUE_SQL = text("""
+    INSERT INTO alert_queue (alert_id, chat_id, exchangedate, message)
+    VALUES (:alert_id, :chat_id, :exchangedate, :message)
+    ON CONFLICT (alert_id, exchangedate) DO NOTHING
+""")
+PENDING_SQL = text("SELECT id, chat_id, message FROM alert_queue WHERE sent_at IS NULL ORDER BY id LIMIT :limit")
+MARK_SENT_SQL = text("UPDATE alert_queue SET sent_at = now() WHERE id = ANY(:ids)")
+# Delivered rows are kept for a while so re-running a load does not alert twice
+PURGE_SQL = text("DELETE FROM alert_queue WHERE sent_at < now() - INTERVAL '30 days'")
+
+
+def parse_alert(args):
+    # ["USD", ">", "42.5"] / ["EUR", "move", "1%"] / ["EUR", "1%"] -> (cc, kind, threshold)
+    args = [a for arg in args for a in arg.replace(">", " > ").replace("<", " < ").split()]
+    if len(args) == 2 and args[1].endswith("%"):
+        args = [args[0], "%", args[1]]
+    if len(args) != 3 or args[1].lower() not in OPERATORS:
+        raise ValueError("expected: CC > RATE, CC < RATE or CC move PERCENT")
+    cc, op, value = args[0].upper(), args[1].lower(), args[2].rstrip("%").replace(",", ".")
+    if len(cc) != 3 or not cc.isalpha():
+        raise ValueError(f"bad currency code {args[0]!r}")
+    threshold = float(value)
+    if not math.isfinite(threshold) or threshold >= MAX_THRESHOLD:
+        raise ValueError(f"bad threshold {args[2]!r}")
+    if not threshold > 0:
+        raise ValueError("threshold must be positive")
+    kind = OPERATORS[op]
+    if kind == "move" and threshold > MAX_MOVE:
+        raise ValueError(f"move threshold must be at most {MAX_MOVE}%")
+    return cc, kind, threshold
+
+
+def describe(alert):
+    sign = {"above": ">", "below": "<"}.get(alert["kind"])
+    if sign:
+        return f"{alert['cc']} {sign} {float(alert['threshold']):g}"
+    return f"{alert['cc']} move {float(alert['threshold']):g}%"
+
+
+class AlertIndex:
+    # Thresholds sorted per (cc, kind), so the alerts a rate change triggers are one or two
+    # bisections away instead of a scan over every chat's rules
+    def __init__(self, alerts=()):
+        groups = {}
+        for a in alerts:
+            groups.setdefault((a["cc"], a["kind"]), []).append(a)
+        self.thresholds, self.alerts = {}, {}
+        for key, group in groups.items():
+            group.sort(key=lambda a: a["threshold"])
+            self.thresholds[key] = [a["threshold"] for a in group]
+            self.alerts[key] = group
+
+    def __len__(self):
+        return sum(len(v) for v in self.alerts.values())
+
+    def _range(self, cc, kind, lo, hi, left=True):
+        # Alerts of (cc, kind) with lo <= threshold < hi (left) or lo < threshold <= hi
+        ts = self.thresholds.get((cc, kind))
+        if not ts:
+            return []
+        find = bisect_left if left else bisect_right
+        return self.alerts[(cc, kind)][find(ts, lo):find(ts, hi)]
+
+    def triggered(self, cc, rate, prev_rate=None, base_rate=None):
+        # [(alert, message)] for one currency. above/below fire when the rate crosses the
+        # threshold since the last rate known before the load; move compares with the previous day
+        out = []
+        if base_rate is not None:
+            for a in self._range(cc, "above", base_rate, rate):
+                out.append((a, f"🔔 {cc} rose above {a['threshold']:g}: {rate:.4f} UAH"))
+            for a in self._range(cc, "below", rate, base_rate, left=False):
+                out.append((a, f"🔔 {cc} fell below {a['threshold']:g}: {rate:.4f} UAH"))
+        if prev_rate:
+            move = (rate / prev_rate - 1) * 100
+            for a in self._range(cc, "move", 0, abs(move), left=False):
+                out.append((a, f"🔔 {cc} moved {move:+.2f}% in a day: {rate:.4f} UAH"))
+        return out
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def load_index(conn, currencies):
+    rows = conn.execute(ACTIVE_SQL, {"ccs": list(currencies)}).fetchall()
+    return AlertIndex({**r._mapping, "threshold": float(r.threshold)} for r in rows)
+
+
+def enqueue_for_frame(engine, df):
+    # After a load: find the alerts the loaded rates trigger and queue them for delivery
+    from daily_stats import affected_since
+
+    if engine.dialect.name != "postgresql":
+        print("# Alerts are evaluated on PostgreSQL only, skipping")
+        return 0
+    since = affected_since(df)
+    if not since:
+        return 0
+    with engine.begin() as conn:
+        index = load_index(conn, since)
+        if not len(index):
+            return 0
+        moves = conn.execute(MOVES_SQL, {"ccs": list(since), "since": list(since.values())}).fetchall()
+        queued = []
+        for m in moves:
+            for alert, message in index.triggered(m.cc, float(m.rate), _float(m.prev_rate), _float(m.base_rate)):
+                queued.append({"alert_id": alert["id"], "chat_id": alert["chat_id"],
+                               "exchangedate": m.exchangedate, "message": f"{message} ({m.exchangedate})"})
+        if queued:
+            conn.execute(ENQUEUE_SQL, queued)
+    metrics.count("alerts_triggered", len(queued))
+    print(f"+ {len(queued)} alerts triggered, {len(index)} checked")
+    return len(queued)
+
+
+@metrics.span("alerts")
+def deliver_alerts(engine, token=None, api_base=None, limit=DELIVERY_BATCH):
+    # Send queued alerts, one message per chat; failed chats stay queued for the next run
+    from broadcast import Broadcaster, prune_blocked
+
+    token = token or os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        print("# TELEGRAM_BOT_TOKEN not set, alerts stay queued")
+        return 0
+    with engine.connect() as conn:
+        rows = conn.execute(PENDING_SQL, {"limit": limit}).fetchall()
+    if not rows:
+        print("+ No queued alerts")
+        return 0
+
+    messages, ids = {}, {}
+    for r in rows:
+        messages.setdefault(r.chat_id, []).append(r.message)
+        ids.setdefault(r.chat_id, []).append(r.id)
+
+    async def run():
+        async with Broadcaster(token, api_base=api_base) as b:
+            return await b.send_texts({chat_id: "\n".join(m) for chat_id, m in messages.items()})
+
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    sent_ids = [i for chat_id in result["sent"] for i in ids[chat_id]]
+    if sent_ids:
+        with engine.begin() as conn:
+            conn.execute(MARK_SENT_SQL, {"ids": sent_ids})
+            conn.execute(PURGE_SQL)
+    for chat_id, err in result["failed"].items():
+        print(f"# Failed to send alerts to {chat_id}: {err}")
+    prune_blocked(engine, result["blocked"])
+    metrics.count("alerts_sent", len(sent_ids))
+    print(f"+ Sent {len(sent_ids)} alerts to {len(result['sent'])}/{len(messages)} chats "
+          f"in {time.perf_counter() - started:.2f}s")
+    return len(sent_ids)
@@ -0,0 +1,140 @@
+import json
+from datetime import datetime, date
+from decimal import Decimal
+from sqlalchemy import text, bindparam
+
+DEFAULT_CURRENCIES = ("USD", "EUR")
+# Change is measured against the rate `horizon` calendar days before the latest one
+# (the last rate published on or before that day, so gaps are forward-filled)
+DEFAULT_HORIZON = 30
+# Min/max window in calendar days, ending at each currency's latest rate
+# (the same window currency_daily_stats keeps, so both report paths agree on stale data)
+DEFAULT_RANGE_DAYS = 365
+
+# All per-currency metrics in one scan: the window functions rank each currency's
+# history once and the FILTERed aggregates pick last / horizon-days-ago / last-year values.
+STATS_QUERY = """
+    WITH hist AS (
+        SELECT cc, rate, exchangedate,
+               MAX(exchangedate) OVER (PARTITION BY cc) - CAST(:horizon AS INTEGER) AS ago_date,
+               MAX(exchangedate) OVER (PARTITION BY cc) - (CAST(:range_days AS INTEGER) - 1) AS range_start
+        FROM exchange_rates
+        WHERE cc IN :currencies
+    ),
+    ranked AS (
+        SELECT cc, rate, exchangedate, ago_date, range_start,
+               ROW_NUMBER() OVER (PARTITION BY cc ORDER BY exchangedate DESC) AS rn,
+               ROW_NUMBER() OVER (PARTITION BY cc ORDER BY exchangedate) AS rn_first,
+               ROW_NUMBER() OVER (PARTITION BY cc, exchangedate <= ago_date ORDER BY exchangedate DESC) AS rn_ago
+        FROM hist
+    )
+    SELECT cc,
+           MAX(rate) FILTER (WHERE rn = 1) AS last,
+           MAX(rate) FILTER (WHERE rn = 1)
+             - COALESCE(MAX(rate) FILTER (WHERE rn_ago = 1 AND exchangedate <= ago_date),
+                        MAX(rate) FILTER (WHERE rn_first = 1)) AS change_month,
+           MIN(rate) FILTER (WHERE exchangedate >= range_start) AS min_year,
+           MAX(rate) FILTER (WHERE exchangedate >= range_start) AS max_year,
+           AVG(rate) AS avg_all_time,
+           COUNT(*) AS days,
+           MIN(exchangedate) AS first_date,
+           MAX(exchangedate) AS last_date,
+           (SELECT COUNT(DISTINCT cc) FROM exchange_rates) AS num_currencies
+    FROM ranked
+    GROUP BY cc
+"""
+STATS_SQL = text(STATS_QUERY).bindparams(bindparam("currencies", expanding=True))
+
+NUM_CURRENCIES_QUERY = "SELECT COUNT(DISTINCT cc) AS num_currencies FROM exchange_rates"
+NUM_CURRENCIES_SQL = text(NUM_CURRENCIES_QUERY)
+
+
+def serialize_value(v):
+    # Convert DB values into JSON-safe types
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if type(v).__module__ == "numpy" and hasattr(v, "item"):
+        # numpy scalar (checked without importing numpy, analyze.py does not need it)
+        return v.item()
+    try:
+        json.dumps(v)
+        return v
+    except Exception:
+        return str(v)
+
+
+def fetch_stats(conn, currencies=DEFAULT_CURRENCIES, horizon=DEFAULT_HORIZON, range_days=DEFAULT_RANGE_DAYS):
+    # Run the grouped stats query; returns ({cc: metrics}, num_currencies)
+    rows = conn.execute(STATS_SQL, {
+        "currencies": list(currencies), "horizon": horizon, "range_days": range_days,
+    }).fetchall()
+    if not rows:
+        return {}, int(conn.execute(NUM_CURRENCIES_SQL).scalar() or 0)
+    return stats_from_records([dict(r._mapping) for r in rows])
+
+
+def stats_from_records(records):
+    # STATS_QUERY result rows (dicts) -> ({cc: metrics}, num_currencies)
+    stats = {}
+    for rec in records:
+        m = {k: serialize_value(v) for k, v in rec.items()}
+        stats[m.pop("cc")] = m
+    return stats, int(records[0]["num_currencies"] or 0) if records else 0
+
+
+def stats_from_frame(df, currencies=DEFAULT_CURRENCIES, horizon=DEFAULT_HORIZON, range_days=DEFAULT_RANGE_DAYS):
+    # Same metrics as STATS_SQL in one vectorized pass over a (cc, exchangedate, rate) frame
+    import pandas as pd
+
+    num_currencies = int(df["cc"].nunique()) if not df.empty else 0
+    df = df[df["cc"].isin(list(currencies))][["cc", "exchangedate", "rate"]]
+    if df.empty:
+        return {}, num_currencies
+
+    df = df.assign(exchangedate=pd.to_datetime(df["exchangedate"]), rate=df["rate"].astype(float))
+    df = df.sort_values(["cc", "exchangedate"], ignore_index=True)
+    grouped = df.groupby("cc", sort=False)
+    last = grouped["rate"].last()
+    # Last rate published on or before (latest date - horizon days), else the first one
+    ago_date = grouped["exchangedate"].transform("max") - pd.Timedelta(days=horizon)
+    ago = df[df["exchangedate"] <= ago_date].groupby("cc", sort=False)["rate"].last()
+    ago = ago.reindex(last.index).fillna(grouped["rate"].first())
+    range_start = grouped["exchangedate"].transform("max") - pd.Timedelta(days=range_days - 1)
+    recent = df.loc[df["exchangedate"] >= range_start].groupby("cc")["rate"]
+    agg = df.groupby("cc").agg(
+        avg_all_time=("rate", "mean"),
+        days=("rate", "size"),
+        first_date=("exchangedate", "min"),
+        last_date=("exchangedate", "max"),
+    )
+    agg["last"] = last
+    agg["change_month"] = last - ago
+    agg["min_year"] = recent.min()
+    agg["max_year"] = recent.max()
+
+    stats = {}
+    for cc, row in agg.iterrows():
+        m = row.to_dict()
+        m["first_date"] = m["first_date"].date()
+        m["last_date"] = m["last_date"].date()
+        stats[cc] = {k: serialize_value(None if pd.isna(v) else v) for k, v in m.items()}
+    return stats, num_currencies
+
+
+def build_report(stats, num_currencies, currencies=DEFAULT_CURRENCIES):
+    # Shape stats into the nested report structure ({"usd": {...}, "eur": {...}, "general": {...}})
+    structured = {}
+    for cc in currencies:
+        s = stats.get(cc, {})
+        key = cc.lower()
+        structured[key] = {
+            "last": s.get("last"),
+            "change_month": s.get("change_month") if s.get("change_month") is not None else 0.0,
+            "range_year": {f"min_{key}": s.get("min_year"), f"max_{key}": s.get("max_year")},
+            "avg_all_time": s.get("avg_all_time"),
+            "days": s.get("days", 0),
+        }
+    structured["general"] = {"num_currencies": num_currencies}
+    return structured
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import random
+import asyncio
+import aiohttp
+from pathlib import Path
+from sqlalchemy import text
+import metrics
+
+# Override to point at a local fake Bot API server in tests
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+
+# Telegram allows ~30 messages/s per bot across all chats
+RATE_PER_SEC = float(os.getenv("TELEGRAM_RATE", "25"))
+CONCURRENCY = int(os.getenv("TELEGRAM_CONCURRENCY", "20"))
+MAX_RETRIES = 5
+# Photos per sendMediaGroup album
+MEDIA_GROUP_SIZE = 10
+
+
+class TelegramError(Exception):
+    def __init__(self, code, description):
+        super().__init__(f"{code}: {description}")
+        self.code = code
+        self.description = description
+
+    @property
+    def blocked(self):
+        # The chat can never receive messages again: user blocked the bot, was deactivated, chat is gone
+        desc = (self.description or "").lower()
+        return self.code == 403 or (self.code == 400 and "chat not found" in desc)
+
+
+class TokenBucket:
+    # Shared rate limiter; pause() honors Telegram's retry_after for all senders
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _chunks(items, size=MEDIA_GROUP_SIZE):
+    # sendMediaGroup takes up to 10 items, longer lists go out as several albums
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class Broadcaster:
+    def __init__(self, token, rate=RATE_PER_SEC, concurrency=CONCURRENCY, api_base=None):
+        self.base = f"{api_base or API_BASE}/bot{token}"
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def call(self, method, data=None, files=None):
+        # One Bot API call with rate limiting, retry_after handling and retries on 5xx/network errors
+        for attempt in range(MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            kwargs = {"json": data}
+            if files:
+                # multipart bodies are single-use, rebuild on every attempt
+                payload = aiohttp.FormData()
+                for k, v in (data or {}).items():
+                    payload.add_field(k, v if isinstance(v, str) else json.dumps(v))
+                for name, path in files.items():
+                    payload.add_field(name, Path(path).read_bytes(), filename=Path(path).name)
+                kwargs = {"data": payload}
+            try:
+                async with self.session.post(f"{self.base}/{method}", **kwargs) as resp:
+                    body = await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                # ValueError: a non-JSON body, e.g. an HTML 502 page from a proxy
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(random.uniform(0, 2 ** attempt))
+                continue
+            if body.get("ok"):
+                return body["result"]
+            code = body.get("error_code", resp.status)
+            retry_after = (body.get("parameters") or {}).get("retry_after")
+            if code == 429 and retry_after is not None and attempt < MAX_RETRIES:
+                self.bucket.pause(float(retry_after))
+                continue
+            if code >= 500 and attempt < MAX_RETRIES:
+                await asyncio.sleep(random.uniform(0, 2 ** attempt))
+                continue
+            raise TelegramError(code, body.get("description"))
+
+    @staticmethod
+    def _file_id(message):
+        # Largest photo size of a sent message
+        return message["photo"][-1]["file_id"]
+
+    async def upload_photos(self, chat_id, photos):
+        # Send the PNGs to one chat (one album per MEDIA_GROUP_SIZE) and return their Telegram file_ids for reuse
+        file_ids = []
+        for chunk in _chunks(photos):
+            if len(chunk) == 1:
+                msg = await self.call("sendPhoto", {"chat_id": str(chat_id)}, files={"photo": chunk[0]})
+                file_ids.append(self._file_id(msg))
+                continue
+            media = [{"type": "photo", "media": f"attach://photo{i}"} for i in range(len(chunk))]
+            msgs = await self.call("sendMediaGroup", {"chat_id": str(chat_id), "media": media},
+                                   files={f"photo{i}": p for i, p in enumerate(chunk)})
+            file_ids.extend(self._file_id(m) for m in msgs)
+        return file_ids
+
+    async def send_photos(self, chat_id, file_ids):
+        for chunk in _chunks(file_ids):
+            if len(chunk) == 1:
+                await self.call("sendPhoto", {"chat_id": chat_id, "photo": chunk[0]})
+            else:
+                await self.call("sendMediaGroup", {"chat_id": chat_id,
+                                                   "media": [{"type": "photo", "media": fid} for fid in chunk]})
+
+    async def broadcast(self, chat_ids, photos=(), message=None):
+        # Upload photos once, then fan out file_ids and the text to every chat.
+        # Returns {"sent": [...], "failed": {chat_id: error}, "blocked": [...]}.
+        photos = [Path(p) for p in photos]
+        sent, failed = [], {}
+        pending = list(chat_ids)
+        file_ids = []
+
+        # Upload through the first chat that accepts it
+        while photos and pending and not file_ids:
+            chat_id = pending.pop(0)
+            try:
+                file_ids = await self.upload_photos(chat_id, photos)
+                if message:
+                    await self.call("sendMessage", {"chat_id": chat_id, "text": message})
+                sent.append(chat_id)
+            except Exception as e:
+                failed[chat_id] = e
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id):
+            async with sem:
+                try:
+                    if file_ids:
+                        await self.send_photos(chat_id, file_ids)
+                    if message:
+                        await self.call("sendMessage", {"chat_id": chat_id, "text": message})
+                    sent.append(chat_id)
+                except Exception as e:
+                    failed[chat_id] = e
+
+        await asyncio.gather(*(deliver(c) for c in pending))
+        blocked = [c for c, e in failed.items() if isinstance(e, TelegramError) and e.blocked]
+        return {"sent": sent, "failed": failed, "blocked": blocked}
+
+    async def send_texts(self, messages):
+        # A different text per chat ({chat_id: text}), same result shape as broadcast()
+        sent, failed = [], {}
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id, message):
+            async with sem:
+                try:
+                    await self.call("sendMessage", {"chat_id": chat_id, "text": message})
+                    sent.append(chat_id)
+                except Exception as e:
+                    failed[chat_id] = e
+
+        await asyncio.gather(*(deliver(c, m) for c, m in messages.items()))
+        blocked = [c for c, e in failed.items() if isinstance(e, TelegramError) and e.blocked]
+        return {"sent": sent, "failed": failed, "blocked": blocked}
+
+
+def prune_blocked(engine, chat_ids):
+    # Remove chats that can no longer receive messages, with their alerts
+    if not chat_ids:
+        return 0
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM telegram_users WHERE chat_id = ANY(:ids)"), {"ids": list(chat_ids)})
+        conn.execute(text("DELETE FROM alerts WHERE chat_id = ANY(:ids)"), {"ids": list(chat_ids)})
+    print(f"+ Pruned {len(chat_ids)} blocked subscribers")
+    return len(chat_ids)
+
+
+@metrics.span("send")
+def broadcast_report(token, engine, photos, message, api_base=None):
+    # Sync entry point for the DAG: send charts + text to all subscribers
+    with engine.connect() as conn:
+        chat_ids = [r[0] for r in conn.execute(text("SELECT chat_id FROM telegram_users")).fetchall()]
+    if not chat_ids:
+        print("# No subscribers")
+        return {"sent": [], "failed": {}, "blocked": []}
+
+    async def run():
+        async with Broadcaster(token, api_base=api_base) as b:
+            return await b.broadcast(chat_ids, photos, message)
+
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    for chat_id, err in result["failed"].items():
+        print(f"# Failed to send to {chat_id}: {err}")
+        reason = "blocked" if chat_id in result["blocked"] else type(err).__name__
+        metrics.count("telegram_send_failures", reason=reason)
+    metrics.count("telegram_sent", len(result["sent"]))
+    prune_blocked(engine, result["blocked"])
+    print(f"+ Sent to {len(result['sent'])}/{len(chat_ids)} chats in {time.perf_counter() - started:.2f}s")
+    return result
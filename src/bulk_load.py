@@ -0,0 +1,174 @@
+import io
+import os
+import time
+import pandas as pd
+from sqlalchemy import text
+import metrics
+
+# Rows sent to the staging table per COPY / executemany round trip
+DEFAULT_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "5000"))
+
+COLUMNS = ["cc", "txt", "rate", "rate_per_100", "exchangedate"]
+STAGING_TABLE = "exchange_rates_stage"
+
+# Values that make a staged row different from the stored one
+CHANGED = " OR ".join(f"exchange_rates.{c} {{distinct}} EXCLUDED.{c}" for c in ("rate", "rate_per_100", "txt"))
+
+# One set-based upsert from the staging table into the target table that only writes rows
+# whose values differ (no dead tuples/WAL for identical reruns) and records what it wrote in
+# the rate_changes feed, in the same statement. "old" reads the pre-statement snapshot.
+UPSERT_SQL = f"""
+WITH old AS (
+    SELECT t.cc, t.exchangedate, t.rate
+    FROM exchange_rates t JOIN {STAGING_TABLE} s USING (cc, exchangedate)
+),
+changed AS (
+    INSERT INTO exchange_rates (cc, txt, rate, rate_per_100, exchangedate)
+    SELECT cc, txt, rate, rate_per_100, exchangedate FROM {STAGING_TABLE}
+    ON CONFLICT (cc, exchangedate) DO UPDATE
+      SET rate = EXCLUDED.rate,
+          rate_per_100 = EXCLUDED.rate_per_100,
+          txt = EXCLUDED.txt
+      WHERE {CHANGED.format(distinct="IS DISTINCT FROM")}
+    RETURNING cc, exchangedate, rate
+)
+INSERT INTO rate_changes (cc, exchangedate, op, old_rate, rate)
+SELECT c.cc, c.exchangedate, CASE WHEN o.cc IS NULL THEN 'insert' ELSE 'update' END, o.rate, c.rate
+FROM changed c LEFT JOIN old o ON o.cc = c.cc AND o.exchangedate = c.exchangedate
+RETURNING cc, exchangedate, op;
+"""
+
+# Portable variant (SQLite: no data-modifying CTEs); "WHERE true" keeps SQLite's parser
+# happy with INSERT ... SELECT ... ON CONFLICT
+OLD_SQL = f"""
+SELECT t.cc, t.exchangedate, t.rate
+FROM exchange_rates t JOIN {STAGING_TABLE} s ON s.cc = t.cc AND s.exchangedate = t.exchangedate
+"""
+PLAIN_UPSERT_SQL = f"""
+INSERT INTO exchange_rates (cc, txt, rate, rate_per_100, exchangedate)
+SELECT cc, txt, rate, rate_per_100, exchangedate FROM {STAGING_TABLE}
+WHERE true
+ON CONFLICT (cc, exchangedate) DO UPDATE
+  SET rate = EXCLUDED.rate,
+      rate_per_100 = EXCLUDED.rate_per_100,
+      txt = EXCLUDED.txt
+  WHERE {CHANGED.format(distinct="IS NOT")}
+RETURNING cc, exchangedate, rate;
+"""
+FEED_SQL = """
+INSERT INTO rate_changes (cc, exchangedate, op, old_rate, rate)
+VALUES (:cc, :exchangedate, :op, :old_rate, :rate)
+"""
+
+CHANGE_COLUMNS = ["cc", "exchangedate", "op"]
+
+
+def _prepare(df):
+    # Keep only target columns, normalise dates and drop duplicate keys
+    # (ON CONFLICT cannot touch the same row twice in one statement)
+    out = df[COLUMNS].copy()
+    out["exchangedate"] = pd.to_datetime(out["exchangedate"]).dt.strftime("%Y-%m-%d")
+    out["rate"] = out["rate"].astype(float)
+    out["rate_per_100"] = out["rate_per_100"].astype(float)
+    return out.drop_duplicates(subset=["cc", "exchangedate"], keep="last")
+
+
+def _create_staging(conn):
+    if conn.dialect.name == "postgresql":
+        # Same types as exchange_rates, so values are rounded before they are compared
+        conn.execute(text(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                cc VARCHAR(10), txt VARCHAR(100), rate NUMERIC(18, 6),
+                rate_per_100 NUMERIC(20, 6), exchangedate DATE
+            ) ON COMMIT DROP
+        """))
+    else:
+        conn.execute(text(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                cc VARCHAR(10), txt VARCHAR(100), rate NUMERIC,
+                rate_per_100 NUMERIC, exchangedate DATE
+            )
+        """))
+        conn.execute(text(f"DELETE FROM {STAGING_TABLE}"))
+
+
+def _copy_batches(conn, df, batch_size):
+    # Stream CSV chunks through COPY FROM STDIN (psycopg2 only)
+    cursor = conn.connection.driver_connection.cursor()
+    copy_sql = f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    try:
+        for start in range(0, len(df), batch_size):
+            buf = io.StringIO()
+            df.iloc[start:start + batch_size].to_csv(buf, header=False, index=False)
+            buf.seek(0)
+            cursor.copy_expert(copy_sql, buf)
+    finally:
+        cursor.close()
+
+
+def _insert_batches(conn, df, batch_size):
+    # Portable fallback: batched executemany (multi-row VALUES where supported)
+    stmt = text(f"""
+        INSERT INTO {STAGING_TABLE} ({', '.join(COLUMNS)})
+        VALUES (:cc, :txt, :rate, :rate_per_100, :exchangedate)
+    """)
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    for start in range(0, len(records), batch_size):
+        conn.execute(stmt, records[start:start + batch_size])
+
+
+def _supports_copy(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        return hasattr(cursor, "copy_expert")
+    finally:
+        cursor.close()
+
+
+def _upsert_portable(conn):
+    old = {(r.cc, str(r.exchangedate)): r.rate for r in conn.execute(text(OLD_SQL))}
+    changes = []
+    for r in conn.execute(text(PLAIN_UPSERT_SQL)).fetchall():
+        key = (r.cc, str(r.exchangedate))
+        changes.append({"cc": r.cc, "exchangedate": r.exchangedate, "op": "update" if key in old else "insert",
+                        "old_rate": old.get(key), "rate": r.rate})
+    if changes:
+        conn.execute(text(FEED_SQL), changes)
+    return [(c["cc"], c["exchangedate"], c["op"]) for c in changes]
+
+
+def bulk_upsert(df, engine, batch_size=DEFAULT_BATCH_SIZE):
+    # Stage DataFrame into a temp table and upsert it into exchange_rates in one statement.
+    # Returns the rows actually inserted or updated (cc, exchangedate, op), also appended
+    # to the rate_changes feed; identical rows are left untouched.
+    if df.empty:
+        print("# Nothing to load")
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    data = _prepare(df)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        _create_staging(conn)
+        if _supports_copy(conn):
+            _copy_batches(conn, data, batch_size)
+        else:
+            _insert_batches(conn, data, batch_size)
+        if conn.dialect.name == "postgresql":
+            changed = conn.execute(text(UPSERT_SQL)).fetchall()
+        else:
+            changed = _upsert_portable(conn)
+            conn.execute(text(f"DROP TABLE {STAGING_TABLE}"))
+    elapsed = time.perf_counter() - started
+
+    changes = pd.DataFrame([tuple(r) for r in changed], columns=CHANGE_COLUMNS)
+    changes["exchangedate"] = pd.to_datetime(changes["exchangedate"])
+    rows = len(data)
+    inserted = int((changes["op"] == "insert").sum())
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"+ Upserted {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s): "
+          f"{inserted} inserted, {len(changes) - inserted} updated, {rows - len(changes)} unchanged")
+    metrics.count("rows_upserted", len(changes))
+    metrics.count("rows_unchanged", rows - len(changes))
+    return changes
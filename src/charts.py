@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# Bump when the chart layout changes so cached images are redrawn
+CHART_VERSION = "1"
+CACHE_FILE = ".chart_cache.json"
+DEFAULT_WORKERS = int(os.getenv("CHART_WORKERS", "0")) or None
+
+
+def chart_key(currency, history, forecast, label):
+    # Content hash of everything that ends up on the chart
+    h = hashlib.sha256()
+    h.update(f"{CHART_VERSION}|{currency}|{label}".encode())
+    for frame, cols in ((history, ["exchangedate", "rate", "fitted"]), (forecast, ["exchangedate", "rate"])):
+        for col in cols:
+            h.update(frame[col].to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _render(job):
+    # Draw one chart with the object-oriented Agg API (no pyplot global state, safe in workers)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    started = time.perf_counter()
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(job["dates"], job["rates"], label="Rate")
+    ax.plot(job["dates"], job["fitted"], label=job["label"])
+    ax.plot(job["future_dates"], job["future_rates"], linestyle="--", label="Forecast")
+    ax.set_title(f"{job['currency']} Exchange Rate")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Rate")
+    ax.legend()
+    ax.grid(True)
+
+    out_path = Path(job["out_path"])
+    tmp = out_path.with_suffix(".tmp.png")
+    fig.savefig(tmp)
+    os.replace(tmp, out_path)
+    return job["currency"], str(out_path), time.perf_counter() - started
+
+
+def _load_cache(out_dir):
+    path = out_dir / CACHE_FILE
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_cache(out_dir, updates):
+    # Merge into the cache on disk under a lock: forecast shards render into one folder concurrently
+    path = out_dir / CACHE_FILE
+    with open(out_dir / f"{CACHE_FILE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = _load_cache(out_dir)
+        cache.update(updates)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, path)
+
+
+def render_charts(history, forecast, out_dir, currencies=None, label="7-day rolling avg", workers=DEFAULT_WORKERS):
+    # Render forecast_<cc>.png for every currency in parallel, skipping unchanged charts.
+    # Returns {cc: {"path", "seconds", "cached"}}.
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cache = _load_cache(out_dir)
+
+    hist_by_cc = dict(tuple(history.groupby("cc", sort=False)))
+    future_by_cc = dict(tuple(forecast.groupby("cc", sort=False)))
+    currencies = currencies or list(hist_by_cc)
+
+    results, jobs = {}, []
+    for cc in currencies:
+        if cc not in hist_by_cc:
+            print(f"# No data for {cc}, skipping chart")
+            continue
+        # No forecast rows (horizon 0, series too short for the model): history only
+        hist, fut = hist_by_cc[cc], future_by_cc.get(cc, forecast.iloc[0:0])
+        out_path = out_dir / f"forecast_{cc}.png"
+        key = chart_key(cc, hist, fut, label)
+        if cache.get(cc) == key and out_path.exists():
+            results[cc] = {"path": str(out_path), "seconds": 0.0, "cached": True}
+            continue
+        jobs.append((key, {
+            "currency": cc, "label": label, "out_path": str(out_path),
+            "dates": hist["exchangedate"].to_numpy(), "rates": hist["rate"].to_numpy(),
+            "fitted": hist["fitted"].to_numpy(),
+            "future_dates": fut["exchangedate"].to_numpy(), "future_rates": fut["rate"].to_numpy(),
+        }))
+
+    started = time.perf_counter()
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(_render, [job for _, job in jobs]))
+    else:
+        rendered = [_render(job) for _, job in jobs]
+
+    for (key, _), (cc, path, seconds) in zip(jobs, rendered):
+        results[cc] = {"path": path, "seconds": seconds, "cached": False}
+    if jobs:
+        _save_cache(out_dir, {job["currency"]: key for key, job in jobs})
+
+    for cc, r in results.items():
+        status = "cached" if r["cached"] else f"{r['seconds']:.2f}s"
+        print(f"+ Chart {cc}: {r['path']} ({status})")
+    print(f"+ Rendered {len(jobs)} charts, {len(results) - len(jobs)} cached, "
+          f"{time.perf_counter() - started:.2f}s total")
+    return results
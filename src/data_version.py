@@ -0,0 +1,25 @@
+import os
+import time
+from pathlib import Path
+
+# Bumped after every load that wrote rows; readers (rates_api) drop their caches when it changes
+VERSION_FILE = Path(os.getenv("DATA_VERSION_FILE", "/opt/airflow/data/processed/data_version"))
+
+
+def bump(path=None):
+    # Write a new version (ns timestamp) atomically and return it
+    path = Path(path or VERSION_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    version = str(time.time_ns())
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, path)
+    return version
+
+
+def current(path=None):
+    # Current version, or None before the first load
+    try:
+        return Path(path or VERSION_FILE).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# Hive-partitioned store of processed rates: rates/cc=USD/month=2025-09/part-*.parquet
+DATASET_DIR = Path(os.getenv("RATES_DATASET_DIR", "/opt/airflow/data/processed/rates"))
+
+# Partitions with more files than this are merged into one after a write
+COMPACT_THRESHOLD = int(os.getenv("RATES_COMPACT_THRESHOLD", "8"))
+
+# Columns stored inside the files (cc and month live in the directory names)
+FILE_SCHEMA = pa.schema([
+    ("txt", pa.dictionary(pa.int32(), pa.string())),
+    ("rate", pa.float64()),
+    ("rate_per_100", pa.float64()),
+    ("exchangedate", pa.date32()),
+    # Used to keep the newest version of a (cc, exchangedate) row until compaction
+    ("ingested_at", pa.timestamp("us")),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("cc", pa.dictionary(pa.int32(), pa.string())), ("month", pa.string())]),
+    flavor="hive",
+    dictionaries="infer",
+)
+
+KEY = ["cc", "exchangedate"]
+
+
+def _root(root):
+    return Path(root) if root else DATASET_DIR
+
+
+def _partition_dir(root, cc, month):
+    return root / f"cc={cc}" / f"month={month}"
+
+
+def _to_file_table(df):
+    # Build a typed Arrow table for one partition
+    return pa.table({
+        "txt": pa.array(df["txt"].astype(str), pa.string()).dictionary_encode(),
+        "rate": pa.array(df["rate"], pa.float64()),
+        "rate_per_100": pa.array(df["rate_per_100"], pa.float64()),
+        "exchangedate": pa.array(pd.to_datetime(df["exchangedate"]).dt.date, pa.date32()),
+        "ingested_at": pa.array(df["ingested_at"], pa.timestamp("us")),
+    }, schema=FILE_SCHEMA)
+
+
+def _write_file(part_dir, table):
+    # Write to a hidden temp name and rename, so readers never see half-written files
+    part_dir.mkdir(parents=True, exist_ok=True)
+    name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = part_dir / f".{name}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, part_dir / name)
+    return part_dir / name
+
+
+def write_rates(df, root=None, compact_threshold=COMPACT_THRESHOLD):
+    # Append processed rows to the dataset, one new file per touched (cc, month) partition
+    root = _root(root)
+    if df.empty:
+        return []
+    df = df.copy()
+    df["exchangedate"] = pd.to_datetime(df["exchangedate"])
+    df["month"] = df["exchangedate"].dt.strftime("%Y-%m")
+    df["ingested_at"] = pd.Timestamp.utcnow().tz_localize(None)
+
+    touched = []
+    for (cc, month), part in df.groupby(["cc", "month"], sort=False):
+        part_dir = _partition_dir(root, cc, month)
+        _write_file(part_dir, _to_file_table(part))
+        touched.append(part_dir)
+
+    for part_dir in touched:
+        if len(list(part_dir.glob("part-*.parquet"))) > compact_threshold:
+            compact_partition(part_dir)
+    return touched
+
+
+def _dedupe(df):
+    # Keep the most recently ingested version of every (cc, exchangedate)
+    if df.empty:
+        return df
+    df = df.sort_values("ingested_at", kind="stable")
+    return df.drop_duplicates(subset=KEY, keep="last").sort_values(KEY, ignore_index=True)
+
+
+def compact_partition(part_dir):
+    # Merge all files of one partition into a single deduplicated file
+    files = sorted(Path(part_dir).glob("part-*.parquet"))
+    if len(files) < 2:
+        return False
+    df = pq.ParquetDataset([str(f) for f in files]).read().to_pandas()
+    df["cc"] = Path(part_dir).parent.name.split("=", 1)[1]
+    df = _dedupe(df)
+    _write_file(Path(part_dir), _to_file_table(df))
+    for f in files:
+        f.unlink()
+    return True
+
+
+def compact(root=None, min_files=2):
+    # Compact every partition that has at least min_files files
+    root = _root(root)
+    merged = 0
+    for part_dir in root.glob("cc=*/month=*"):
+        if len(list(part_dir.glob("part-*.parquet"))) >= min_files and compact_partition(part_dir):
+            merged += 1
+    print(f"+ Compacted {merged} partitions in {root}")
+    return merged
+
+
+def open_dataset(root=None, files=None):
+    # files: explicit part files (see partition_files), skips listing the whole tree
+    root = _root(root)
+    if files is not None:
+        return ds.dataset([str(f) for f in files], format="parquet", partitioning=PARTITIONING,
+                          partition_base_dir=str(root), exclude_invalid_files=True)
+    return ds.dataset(str(root), format="parquet", partitioning=PARTITIONING,
+                      exclude_invalid_files=True, ignore_prefixes=[".", "_"])
+
+
+def partition_files(root, currencies, start, end):
+    # Part files of the (cc, month) partitions covering [start, end], found without a tree walk
+    months = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq="M").strftime("%Y-%m")
+    files = []
+    for cc in currencies:
+        for month in months:
+            files.extend(_partition_dir(root, cc, month).glob("part-*.parquet"))
+    return files
+
+
+def rates_filter(currencies=None, start=None, end=None, dates=None):
+    # Build a filter expression; cc and month prune partitions, exchangedate uses row-group stats
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if currencies:
+        expr = _and(ds.field("cc").isin(list(currencies)))
+    if start:
+        start = pd.Timestamp(start).date()
+        expr = _and((ds.field("month") >= start.strftime("%Y-%m")) & (ds.field("exchangedate") >= start))
+    if end:
+        end = pd.Timestamp(end).date()
+        expr = _and((ds.field("month") <= end.strftime("%Y-%m")) & (ds.field("exchangedate") <= end))
+    if dates:
+        days = pa.array([pd.Timestamp(d).date() for d in dates], pa.date32())
+        months = sorted({d.strftime("%Y-%m") for d in days.to_pylist()})
+        expr = _and(ds.field("month").isin(months) & ds.field("exchangedate").isin(days))
+    return expr
+
+
+def scan_rates(currencies=None, start=None, end=None, dates=None, columns=None, root=None):
+    # Predicate-pushdown scan returning an Arrow table (may contain superseded versions)
+    root = _root(root)
+    if not root.exists():
+        return pa.schema([("cc", pa.string())] + list(FILE_SCHEMA)).empty_table()
+    cols = None
+    if columns:
+        cols = list(dict.fromkeys(list(columns) + KEY + ["ingested_at"]))
+    files = None
+    if currencies and start and end and not dates:
+        # Narrow scans (validation look-backs, date ranges) open only their partitions
+        files = partition_files(root, currencies, start, end)
+        if not files:
+            return pa.schema([("cc", pa.string())] + list(FILE_SCHEMA)).empty_table().select(
+                cols or ["cc"] + FILE_SCHEMA.names)
+    return open_dataset(root, files).to_table(columns=cols, filter=rates_filter(currencies, start, end, dates))
+
+
+def read_rates(currencies=None, start=None, end=None, dates=None, columns=None, root=None):
+    # Deduplicated pandas view of the dataset in the shape transform() produces
+    table = scan_rates(currencies, start, end, dates, columns, root)
+    if "cc" in table.column_names:
+        table = table.set_column(table.schema.get_field_index("cc"), "cc", pc.cast(table["cc"], pa.string()))
+    df = _dedupe(table.to_pandas())
+    df["exchangedate"] = pd.to_datetime(df["exchangedate"])
+    if "txt" in df:
+        df["txt"] = df["txt"].astype(str)
+    keep = columns or ["cc", "rate", "txt", "exchangedate", "rate_per_100"]
+    return df[list(keep)]
+
+
+if __name__ == "__main__":
+    compact()
@@ -1,33 +1,183 @@
-import requests
+import os
 import json
+import time
+import random
+import argparse
+import contextvars
+import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from datetime import datetime
+import metrics
+from http_cache import default_cache
+from ingest import raw_name, find_raw, write_raw
+from datetime import datetime, date, timedelta
 
 load_dotenv()
 
 RAW_DIR = Path("/opt/airflow/data/raw")
 
-RAW_DIR.mkdir(parents=True, exist_ok=True)
+# Base endpoint (override to point at a local stub server in tests)
+NBU_URL = os.getenv("NBU_API_URL", "https://bank.gov.ua/NBUStatService/v1/statdirectory/exchange")
+
+# Backfill tuning
+DEFAULT_CONCURRENCY = int(os.getenv("NBU_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("NBU_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("NBU_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# On-disk response cache (None when NBU_CACHE_DIR is empty)
+CACHE = default_cache()
+# fetch_nbu(cache=...) default: the module CACHE; cache=None bypasses caching
+_DEFAULT = object()
+
+
+def make_session(pool_size=DEFAULT_CONCURRENCY):
+    # Keep-alive session with a connection pool sized for the worker count
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def nbu_url(day=None):
+    # Today's snapshot or the snapshot for a given date
+    if day is None:
+        return f"{NBU_URL}?json"
+    return f"{NBU_URL}?date={day.strftime('%Y%m%d')}&json"
+
+
+def _retry_delay(attempt, resp=None):
+    # Honor Retry-After on rate limiting, otherwise exponential backoff with full jitter
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_CAP)
+            except ValueError:
+                pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_published(day):
+    # Rates of past dates never change once published; today's snapshot may still be revised
+    return day is not None and day < datetime.utcnow().date()
+
+
+def fetch_nbu(day=None, session=None, retries=MAX_RETRIES, cache=_DEFAULT):
+    # Fetch exchange rates from NBU public API, through the on-disk cache:
+    # published dates are served from disk, today's snapshot is revalidated with ETag/Last-Modified
+    http = session or requests
+    cache = CACHE if cache is _DEFAULT else cache
+    url = nbu_url(day)
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        metrics.count("http_cache", result="hit")
+        return json.loads(entry["body"])
 
-def fetch_nbu():
-    # Fetch exchange rates from NBU public API
-    url = "https://bank.gov.ua/NBUStatService/v1/statdirectory/exchange?json"
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    return resp.json()
+    headers = cache.conditional_headers(entry) if cache else {}
+    for attempt in range(retries + 1):
+        try:
+            resp = http.get(url, timeout=10, headers=headers)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            metrics.count("http_retries", reason="network")
+            time.sleep(_retry_delay(attempt))
+            continue
+        if resp.status_code in RETRY_STATUSES and attempt < retries:
+            metrics.count("http_retries", reason=str(resp.status_code))
+            time.sleep(_retry_delay(attempt, resp))
+            continue
+        if resp.status_code == 304 and entry:
+            cache.touch(url, entry)
+            metrics.count("http_cache", result="revalidated")
+            return json.loads(entry["body"])
+        resp.raise_for_status()
+        metrics.count("bytes_fetched", len(resp.content))
+        data = resp.json()
+        if cache:
+            # An empty answer for a past date is not trusted as final
+            cache.put(url, resp, immutable=is_published(day) and bool(data))
+            metrics.count("http_cache", result="miss")
+        return data
 
-def save_raw(data):
-    # Save raw API response to dated folder
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    out_dir = RAW_DIR / today
+
+def raw_path(day):
+    # Existing snapshot for a date in any raw format, or None
+    return find_raw(RAW_DIR / day.strftime("%Y-%m-%d"))
+
+
+def save_raw(data, day=None):
+    # Save raw API response to dated folder as compact (compressed) JSON
+    day = day or datetime.utcnow().date()
+    out_dir = RAW_DIR / day.strftime("%Y-%m-%d")
     out_dir.mkdir(parents=True, exist_ok=True)
-    fname = out_dir / "response.json"
-    with open(fname, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print("+ Saved raw to", fname)
+    fname = out_dir / raw_name()
+    # Written via a temp file so an interrupted backfill never leaves a partial snapshot
+    size = write_raw(data, fname)
+    metrics.count("bytes_saved", size)
+    metrics.count("rows_written", len(data))
+    print(f"+ Saved raw to {fname} ({size} bytes)")
 
 
-if __name__ == "__main__":
+@metrics.span("extract")
+def extract():
+    # Fetch today's snapshot and archive it; returns the raw records
     data = fetch_nbu()
-    save_raw(data)
\ No newline at end of file
+    save_raw(data)
+    if CACHE:
+        CACHE.evict()
+    return data
+
+
+def pending_dates(start, end):
+    # Dates in [start, end] that have no raw snapshot on disk yet (resume support)
+    days = (end - start).days + 1
+    return [d for d in (start + timedelta(days=i) for i in range(days)) if raw_path(d) is None]
+
+
+@metrics.span("extract", mode="backfill")
+def backfill(start, end, concurrency=DEFAULT_CONCURRENCY):
+    # Fetch every missing date in the range with a bounded thread pool
+    todo = pending_dates(start, end)
+    if not todo:
+        print("+ Nothing to backfill, all dates are on disk")
+        return [], []
+
+    print(f"+ Backfilling {len(todo)} dates with {concurrency} workers")
+    done, failed = [], []
+    with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Each worker call runs in a copy of the current context so counters keep the stage label
+        futures = {pool.submit(contextvars.copy_context().run, fetch_nbu, d, session): d for d in todo}
+        for fut in as_completed(futures):
+            day = futures[fut]
+            try:
+                save_raw(fut.result(), day)
+                done.append(day)
+            except Exception as e:
+                print(f"# Failed {day}: {e}")
+                failed.append(day)
+    print(f"+ Backfill finished: {len(done)} saved, {len(failed)} failed")
+    return sorted(done), sorted(failed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract NBU exchange rates")
+    parser.add_argument("--start", type=date.fromisoformat, help="backfill from date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="backfill to date (default: today)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.start:
+        _, failed = backfill(args.start, args.end or datetime.utcnow().date(), args.concurrency)
+        if failed:
+            raise SystemExit(f"# {len(failed)} dates failed, rerun to resume")
+    else:
+        extract()
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import text, bindparam
+from timeseries import fill_calendar, rolling, FREQ
+
+# Only the columns and history window the models and charts need
+SERIES_QUERY = """
+    SELECT cc, exchangedate, rate
+    FROM exchange_rates
+    WHERE cc IN :currencies AND exchangedate >= :since
+    ORDER BY cc, exchangedate
+"""
+SERIES_SQL = text(SERIES_QUERY).bindparams(bindparam("currencies", expanding=True))
+
+DEFAULT_HORIZON = 5
+DEFAULT_WINDOW = 7
+DEFAULT_LOOKBACK_DAYS = 365
+
+# name -> fn(df, window) returning (fitted Series aligned with df, level per cc, slope per cc)
+MODELS = {}
+
+
+def register_model(name):
+    # Decorator to plug in a forecasting model
+    def wrap(fn):
+        MODELS[name] = fn
+        return fn
+    return wrap
+
+
+def series_since(lookback_days=DEFAULT_LOOKBACK_DAYS, today=None):
+    return (today or datetime.utcnow().date()) - timedelta(days=lookback_days)
+
+
+def load_series(conn, currencies, lookback_days=DEFAULT_LOOKBACK_DAYS, today=None):
+    # Fetch (cc, exchangedate, rate) for the requested currencies and window, sorted by cc/date
+    since = series_since(lookback_days, today)
+    df = pd.read_sql(SERIES_SQL, conn, params={"currencies": list(currencies), "since": since})
+    return prepare_series(df)
+
+
+def prepare_series(df, freq=FREQ):
+    # Calendar grid with forward-filled gaps ("filled" marks days NBU did not publish),
+    # so every window below is a time window: 7 rows = 7 days
+    df = df[["cc", "exchangedate", "rate"]].copy()
+    df["rate"] = df["rate"].astype(float)
+    return fill_calendar(df, freq=freq).sort_values(["cc", "exchangedate"], ignore_index=True)
+
+
+def _last_per_cc(df, values):
+    # Last value of each currency (df is sorted by cc, exchangedate)
+    return values.groupby(df["cc"], sort=False).last()
+
+
+@register_model("rolling")
+def rolling_mean(df, window):
+    # Time-based window ("7D"), robust even if the series was not calendar-filled
+    fitted = rolling(df, f"{window}D")
+    level = _last_per_cc(df, fitted)
+    return fitted, level, pd.Series(0.0, index=level.index)
+
+
+@register_model("ewma")
+def ewma(df, window):
+    fitted = (df.groupby("cc", sort=False)["rate"]
+                .ewm(span=window, adjust=False).mean()
+                .reset_index(level=0, drop=True))
+    level = _last_per_cc(df, fitted)
+    return fitted, level, pd.Series(0.0, index=level.index)
+
+
+@register_model("linear")
+def linear_trend(df, window):
+    # Least-squares line over the last `window` observations of every currency at once,
+    # using grouped sums instead of a per-currency fit
+    grouped = df.groupby("cc", sort=False)
+    x = grouped.cumcount().astype(float)
+    in_window = grouped.cumcount(ascending=False) < window
+    w = pd.DataFrame({"cc": df["cc"], "x": x, "y": df["rate"]})[in_window]
+    w["xx"] = w["x"] ** 2
+    w["xy"] = w["x"] * w["y"]
+    s = w.groupby("cc", sort=False).agg(n=("x", "size"), sx=("x", "sum"), sy=("y", "sum"),
+                                         sxx=("xx", "sum"), sxy=("xy", "sum"), x_last=("x", "max"))
+    denom = s["n"] * s["sxx"] - s["sx"] ** 2
+    slope = ((s["n"] * s["sxy"] - s["sx"] * s["sy"]) / denom.replace(0, np.nan)).fillna(0.0)
+    intercept = (s["sy"] - slope * s["sx"]) / s["n"]
+    fitted = (intercept.reindex(df["cc"]).to_numpy() + slope.reindex(df["cc"]).to_numpy() * x)
+    fitted = fitted.where(in_window)
+    level = intercept + slope * s["x_last"]
+    return fitted, level, slope
+
+
+def forecast_all(df, model="rolling", horizon=DEFAULT_HORIZON, window=DEFAULT_WINDOW, freq=FREQ):
+    # Fit one model for every currency in a single pass.
+    # Returns (history with a "fitted" column, forecast frame cc/exchangedate/rate).
+    if model not in MODELS:
+        raise ValueError(f"Unknown forecast model {model!r}, available: {sorted(MODELS)}")
+    history = df.copy()
+    if history.empty:
+        history["fitted"] = pd.Series(dtype=float)
+        return history, pd.DataFrame(columns=["cc", "exchangedate", "rate"])
+
+    fitted, level, slope = MODELS[model](history, window)
+    history["fitted"] = fitted
+
+    # Forecast grid: horizon future days per currency on the same calendar as the history
+    last_date = history.groupby("cc", sort=False)["exchangedate"].max()
+    ccs = np.repeat(last_date.index.to_numpy(), horizon)
+    steps = np.tile(np.arange(1, horizon + 1), len(last_date))
+    last = np.repeat(last_date.to_numpy().astype("datetime64[D]"), horizon)
+    if freq == "B":
+        dates = np.busday_offset(last, steps, roll="forward").astype("datetime64[ns]")
+    else:
+        dates = (last + steps).astype("datetime64[ns]")
+    rates = np.repeat(level.reindex(last_date.index).to_numpy(), horizon) \
+        + np.repeat(slope.reindex(last_date.index).to_numpy(), horizon) * steps
+    forecast = pd.DataFrame({"cc": ccs, "exchangedate": dates, "rate": rates})
+    return history, forecast
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+# Empty NBU_CACHE_DIR disables the cache
+CACHE_DIR = os.getenv("NBU_CACHE_DIR", "/opt/airflow/data/cache/nbu")
+# Mutable responses (today's rates) are served without revalidation for TTL seconds
+# and evicted after MAX_AGE seconds; published historical dates never expire
+TTL = float(os.getenv("NBU_CACHE_TTL", "3600"))
+MAX_AGE = float(os.getenv("NBU_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+class HttpCache:
+    # On-disk response cache: <sha256(url)>.body holds the payload, <sha256(url)>.json its metadata
+    def __init__(self, root, ttl=TTL, max_age=MAX_AGE):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_age = max_age
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.root / f"{key}.json", self.root / f"{key}.body"
+
+    @staticmethod
+    def _write(path, data):
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def get(self, url):
+        # Cached entry {"meta": {...}, "body": bytes} or None
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return {"meta": meta, "body": body}
+
+    def is_fresh(self, entry):
+        # Immutable entries are always fresh; mutable ones within their TTL
+        meta = entry["meta"]
+        return meta.get("immutable") or time.time() - meta["checked_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        if entry is None:
+            return {}
+        headers = {}
+        if entry["meta"].get("etag"):
+            headers["If-None-Match"] = entry["meta"]["etag"]
+        if entry["meta"].get("last_modified"):
+            headers["If-Modified-Since"] = entry["meta"]["last_modified"]
+        return headers
+
+    def put(self, url, resp, immutable=False):
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta_path, body_path = self._paths(url)
+        now = time.time()
+        meta = {
+            "url": url,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": now,
+            "checked_at": now,
+            "immutable": bool(immutable),
+        }
+        # Body first, so metadata never points at a missing payload
+        self._write(body_path, resp.content)
+        self._write(meta_path, json.dumps(meta).encode())
+
+    def touch(self, url, entry):
+        # A 304 revalidation restarts the TTL
+        meta_path, _ = self._paths(url)
+        entry["meta"]["checked_at"] = time.time()
+        self._write(meta_path, json.dumps(entry["meta"]).encode())
+
+    def evict(self, max_age=None):
+        # Drop mutable entries not revalidated within max_age seconds; returns the number removed
+        max_age = self.max_age if max_age is None else max_age
+        if not self.root.exists():
+            return 0
+        removed = 0
+        now = time.time()
+        for meta_path in self.root.glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                meta = {}
+            if meta.get("immutable") or now - meta.get("checked_at", 0) < max_age:
+                continue
+            meta_path.unlink(missing_ok=True)
+            meta_path.with_suffix(".body").unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            print(f"+ Evicted {removed} expired NBU cache entries")
+        return removed
+
+
+def default_cache():
+    return HttpCache(CACHE_DIR) if CACHE_DIR else None
+
+
+if __name__ == "__main__":
+    cache = default_cache()
+    if cache is None:
+        raise SystemExit("# NBU_CACHE_DIR is empty, cache disabled")
+    cache.evict()
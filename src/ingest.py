@@ -0,0 +1,193 @@
+import os
+import io
+import gzip
+import json
+import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pathlib import Path
+
+# Optional fast/streaming libraries; plain json is the fallback
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# none | gzip | zstd
+RAW_COMPRESSION = os.getenv("RAW_COMPRESSION", "gzip")
+RAW_NAMES = {"none": "response.json", "gzip": "response.json.gz", "zstd": "response.json.zst"}
+DEFAULT_BATCH_ROWS = int(os.getenv("INGEST_BATCH_ROWS", "65536"))
+
+SCHEMA = pa.schema([
+    ("cc", pa.string()),
+    ("rate", pa.float64()),
+    ("txt", pa.string()),
+    ("exchangedate", pa.date32()),
+    ("rate_per_100", pa.float64()),
+])
+
+
+def raw_name(compression=None):
+    compression = compression or RAW_COMPRESSION
+    if compression not in RAW_NAMES:
+        raise ValueError(f"Unknown RAW_COMPRESSION {compression!r}, use one of {sorted(RAW_NAMES)}")
+    return RAW_NAMES[compression]
+
+
+def find_raw(day_dir):
+    # Raw snapshot of one date folder in any supported format, or None
+    for name in RAW_NAMES.values():
+        path = Path(day_dir) / name
+        if path.exists():
+            return path
+    return None
+
+
+def list_raw_files(raw_dir):
+    # All raw snapshots under RAW_DIR/<date>/, sorted by date
+    files = []
+    for name in RAW_NAMES.values():
+        files.extend(glob.glob(str(Path(raw_dir) / "*" / name)))
+    return sorted(files)
+
+
+def dumps(data):
+    # Compact JSON bytes (no indentation)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_raw(data, path):
+    # Write compact (optionally compressed by file suffix) JSON atomically
+    path = Path(path)
+    payload = data if isinstance(data, (bytes, bytearray)) else dumps(data)
+    if path.suffix == ".gz":
+        payload = gzip.compress(payload, compresslevel=6)
+    elif path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("RAW_COMPRESSION=zstd needs the 'zstandard' package")
+        payload = zstandard.ZstdCompressor(level=10).compress(payload)
+    tmp = path.parent / f".{path.name}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    return len(payload)
+
+
+def open_raw(path):
+    # Binary stream of the decompressed JSON
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def iter_records(path, currencies=None):
+    # Yield the NBU records of one snapshot, filtered by currency while parsing
+    wanted = set(currencies) if currencies else None
+    with open_raw(path) as f:
+        if ijson is not None:
+            items = ijson.items(f, "item", use_float=True)
+        elif orjson is not None:
+            items = orjson.loads(f.read())
+        else:
+            items = json.load(io.TextIOWrapper(f, encoding="utf-8"))
+        for item in items:
+            if wanted is None or item.get("cc") in wanted:
+                yield item
+
+
+def _float_array(values):
+    try:
+        return pa.array(values, pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # Rare: a non-numeric value somewhere in the batch
+        return pa.array([_to_float(v) for v in values], pa.float64())
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _string_array(values):
+    try:
+        return pa.array(values, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+class BatchBuilder:
+    # Accumulates records column-wise and emits fixed-size Arrow record batches
+    def __init__(self, batch_rows=DEFAULT_BATCH_ROWS):
+        self.batch_rows = batch_rows
+        self._reset()
+
+    def _reset(self):
+        self.cc, self.rate, self.txt, self.date = [], [], [], []
+
+    def __len__(self):
+        return len(self.cc)
+
+    def add(self, item):
+        # Missing or malformed fields become nulls; validate.py quarantines those rows
+        self.cc.append(item.get("cc"))
+        self.rate.append(item.get("rate"))
+        self.txt.append(item.get("txt"))
+        self.date.append(item.get("exchangedate"))
+        if len(self.cc) >= self.batch_rows:
+            return self.flush()
+        return None
+
+    def flush(self):
+        if not self.cc:
+            return None
+        rate = _float_array(self.rate)
+        # dd.MM.yyyy -> date32, vectorized over the whole batch
+        dates = pc.cast(pc.strptime(_string_array(self.date), format="%d.%m.%Y", unit="s", error_is_null=True),
+                        pa.date32())
+        batch = pa.record_batch([
+            _string_array(self.cc),
+            rate,
+            _string_array(self.txt),
+            dates,
+            pc.multiply(rate, 100),
+        ], schema=SCHEMA)
+        self._reset()
+        return batch
+
+
+def iter_record_batches(paths, currencies=None, batch_rows=DEFAULT_BATCH_ROWS):
+    # Stream any number of snapshots as fixed-size record batches (memory stays flat)
+    builder = BatchBuilder(batch_rows)
+    for path in paths:
+        for item in iter_records(path, currencies):
+            batch = builder.add(item)
+            if batch is not None:
+                yield batch
+    batch = builder.flush()
+    if batch is not None:
+        yield batch
+
+
+def batch_to_frame(batch):
+    # pandas frame in the shape transform() has always returned
+    df = batch.to_pandas()
+    df["exchangedate"] = pd.to_datetime(df["exchangedate"])
+    return df[["cc", "rate", "txt", "exchangedate", "rate_per_100"]]
@@ -1,8 +1,17 @@
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
+import metrics
+import data_version
+import change_feed
+from bulk_load import bulk_upsert, DEFAULT_BATCH_SIZE
+from transform import load_manifest, save_manifest
+from dataset import read_rates
+from daily_stats import update_for_frame
+from alerts import enqueue_for_frame
+from schema import ensure_schema, ensure_partitions
 
 load_dotenv()
 
@@ -13,56 +22,73 @@ DB_URL = (
 )
 
 PROCESSED_DIR = Path("/opt/airflow/data/processed")
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
 
 
-def latest_processed_file():
-    # Get latest processed parquet file
-    files = list(PROCESSED_DIR.glob("*/data.parquet"))
-    if not files:
+def pending_dates():
+    # Exchange dates written by incremental transform runs that were not loaded yet
+    if not MANIFEST_PATH.exists():
         return None
-    files.sort(key=os.path.getmtime)
-    return files[-1]
+    return load_manifest(MANIFEST_PATH).get("pending_load", [])
 
 
-def load_to_db(df, engine):
+def mark_loaded(dates):
+    # Drop loaded dates from the transform watermark's pending list
+    manifest = load_manifest(MANIFEST_PATH)
+    loaded = set(dates)
+    manifest["pending_load"] = [d for d in manifest.get("pending_load", []) if d not in loaded]
+    save_manifest(manifest, MANIFEST_PATH)
+
+
+def load_to_db(df, engine, batch_size=DEFAULT_BATCH_SIZE):
     # Ensure exchangedate is datetime
     df['exchangedate'] = pd.to_datetime(df['exchangedate'])
 
-    # Upsert rows into exchange_rates table
-    with engine.begin() as conn:
-        for _, row in df.iterrows():
-            stmt = text("""
-            INSERT INTO exchange_rates (cc, txt, rate, rate_per_100, exchangedate)
-            VALUES (:cc, :txt, :rate, :rate_per_100, :exchangedate)
-            ON CONFLICT (cc, exchangedate) DO UPDATE
-              SET rate = EXCLUDED.rate,
-                  rate_per_100 = EXCLUDED.rate_per_100,
-                  txt = EXCLUDED.txt;
-            """)
-            conn.execute(stmt, {
-                "cc": row['cc'],
-                "txt": row['txt'],
-                "rate": float(row['rate']),
-                "rate_per_100": float(row['rate_per_100']),
-                # формат YYYY-MM-DD (Postgres DATE)
-                "exchangedate": row['exchangedate'].strftime("%Y-%m-%d")
-            })
+    # Bulk upsert rows into exchange_rates table (yearly partitions first);
+    # only rows whose values differ are written and returned
+    ensure_partitions(engine, df)
+    changes = bulk_upsert(df, engine, batch_size=batch_size)
+    if not changes.empty:
+        # Keep currency_daily_stats in sync for the changed (cc, date) range only
+        update_for_frame(engine, changes)
+        # Queue the subscriber alerts these rates trigger (sent by the alerts stage)
+        enqueue_for_frame(engine, changes)
+        # Tell readers (rates_api) that their caches are stale
+        data_version.bump()
+    change_feed.purge(engine)
     print("+ Loaded to DB")
+    return changes
 
 
-if __name__ == "__main__":
-    latest = latest_processed_file()
-    if not latest:
-        raise SystemExit("# No processed file found. Run transform first.")
-    df = pd.read_parquet(latest)
-    if not DB_URL:
-        raise SystemExit("# Set DATABASE_URL in .env")
+@metrics.span("load")
+def load_pending(engine, df=None):
+    # Load every date transform left pending and clear it from the watermark.
+    # df: rows already in memory from the transform stage, used instead of re-reading Parquet
+    # when it covers all pending dates. Returns the number of rows loaded.
+    dates = pending_dates()
+    if dates is None:
+        raise FileNotFoundError("# No processed data found. Run transform first.")
+    if not dates:
+        print("+ No new processed data, nothing to load")
+        return 0
+    if df is None or not set(dates) <= set(pd.to_datetime(df["exchangedate"]).dt.strftime("%Y-%m-%d")):
+        # Partition-pruned scan of only the pending dates
+        df = read_rates(dates=dates)
+
+    metrics.count("rows_read", len(df))
 
-    engine = create_engine(DB_URL)
-    # Create tables if not exists
-    sql = Path("/opt/airflow/sql/create_tables.sql").read_text()
-    with engine.begin() as conn:
-        conn.execute(text(sql))
+    # Create/migrate tables if needed
+    ensure_schema(engine)
 
     load_to_db(df, engine)
+    mark_loaded(dates)
+    return len(df)
+
+
+if __name__ == "__main__":
+    if not DB_URL:
+        raise SystemExit("# Set DATABASE_URL in .env")
+    try:
+        load_pending(create_engine(DB_URL))
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import time
+import fcntl
+import socket
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+
+# node_exporter textfile collector target; empty disables the .prom file
+TEXTFILE = os.getenv("METRICS_TEXTFILE", "/opt/airflow/data/metrics/currency_etl.prom")
+# Structured JSON events: "-" = stdout, a path = append to file, empty = off
+JSON_LOG = os.getenv("METRICS_JSON_LOG", "-")
+PREFIX = "currency_etl_"
+
+HELP = {
+    "rows_read_total": "Rows read by a stage",
+    "rows_written_total": "Rows written by a stage",
+    "rows_upserted_total": "Rows inserted or changed in exchange_rates",
+    "rows_unchanged_total": "Loaded rows identical to the stored ones (not rewritten)",
+    "files_processed_total": "Raw snapshots transformed",
+    "rows_quarantined_total": "Rows rejected by validation, by reason",
+    "charts_cached_total": "Forecast charts reused from the cache",
+    "bytes_fetched_total": "Bytes downloaded from the NBU API",
+    "bytes_saved_total": "Bytes written to raw snapshots",
+    "http_retries_total": "HTTP requests retried by the extractor",
+    "telegram_sent_total": "Chats a Telegram broadcast was delivered to",
+    "alerts_triggered_total": "Subscriber alerts queued after a load",
+    "alerts_sent_total": "Queued subscriber alerts delivered",
+    "telegram_send_failures_total": "Chats a Telegram broadcast failed for",
+    "stage_runs_total": "Finished stage runs by status",
+    "stage_duration_seconds": "Wall time of the last run of a stage",
+    "stage_last_rows": "Rows written by the last run of a stage",
+    "stage_last_success_timestamp_seconds": "Unix time of the last successful run of a stage",
+}
+
+_SAMPLE = re.compile(r"^(\w+)(\{.*\})?\s+(\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# Innermost running span, so counters get a stage label without threading it through calls
+_current = contextvars.ContextVar("metrics_span", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        # Backfill workers count from several threads
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        k = self.key(name, labels)
+        with self.lock:
+            self.counters[k] = self.counters.get(k, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[self.key(name, labels)] = value
+
+    def clear(self):
+        self.counters.clear()
+        self.gauges.clear()
+
+
+REGISTRY = Registry()
+
+
+def _escape(v):
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _fmt_value(v):
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def _parse(text):
+    # Samples of a previous .prom file: {(name, labels): value}
+    samples = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line.strip())
+        if not m or line.startswith("#"):
+            continue
+        name, labels, value = m.groups()
+        labels = tuple(sorted((k, re.sub(r"\\(.)", lambda c: "\n" if c.group(1) == "n" else c.group(1), v))
+                              for k, v in _LABEL.findall(labels or "")))
+        samples[(name[len(PREFIX):] if name.startswith(PREFIX) else name, labels)] = float(value)
+    return samples
+
+
+def count(name, value=1, **labels):
+    # Increment a counter; the current span's stage is added as a label
+    span = _current.get()
+    if span is not None:
+        labels.setdefault("stage", span.stage)
+        with REGISTRY.lock:
+            span.counts[name] = span.counts.get(name, 0) + value
+    REGISTRY.inc(name if name.endswith("_total") else f"{name}_total", value, **labels)
+
+
+def log_event(event, **fields):
+    if not JSON_LOG:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, "host": socket.gethostname(), **fields},
+                      ensure_ascii=False, default=str)
+    if JSON_LOG == "-":
+        print(line, flush=True)
+    else:
+        with open(JSON_LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Span:
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.counts = {}
+        # Set by the caller when "rows written" is not the right throughput measure
+        self.rows = None
+
+
+@contextmanager
+def span(stage, **labels):
+    # Time a stage: duration/last-success gauges, a run counter by status and one JSON event.
+    # The .prom file is rewritten when the outermost span ends. Also usable as a decorator.
+    s = Span(stage, labels)
+    token = _current.set(s)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield s
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        _current.reset(token)
+        REGISTRY.inc("stage_runs_total", stage=stage, status=status, **labels)
+        REGISTRY.set("stage_duration_seconds", seconds, stage=stage, **labels)
+        rows = s.rows if s.rows is not None else s.counts.get("rows_written", s.counts.get("rows_upserted"))
+        if rows is not None:
+            REGISTRY.set("stage_last_rows", rows, stage=stage, **labels)
+        if status == "ok":
+            REGISTRY.set("stage_last_success_timestamp_seconds", time.time(), stage=stage, **labels)
+        log_event("stage", stage=stage, status=status, seconds=round(seconds, 4), rows=rows,
+                  **labels, **{k: v for k, v in s.counts.items()})
+        if _current.get() is None:
+            try:
+                flush()
+            except OSError as e:
+                print(f"# Failed to write metrics: {e}")
+
+
+def flush(path=None):
+    # Merge this process' counters into the textfile (counters keep growing across runs,
+    # gauges are replaced) and write it atomically under a lock
+    path = path or TEXTFILE
+    if not path:
+        return None
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        samples = _parse(path.read_text(encoding="utf-8")) if path.exists() else {}
+        for k, v in REGISTRY.counters.items():
+            samples[k] = samples.get(k, 0) + v
+        samples.update(REGISTRY.gauges)
+        REGISTRY.clear()
+
+        lines = []
+        for name in sorted({n for n, _ in samples}):
+            kind = "counter" if name.endswith("_total") else "gauge"
+            if name in HELP:
+                lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for (n, labels), v in sorted(samples.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+    return path
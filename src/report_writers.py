@@ -0,0 +1,112 @@
+import os
+import io
+import csv
+import json
+import html
+from pathlib import Path
+
+# Formats written by default; parquet needs pyarrow, html is optional
+DEFAULT_FORMATS = [f.strip() for f in os.getenv("REPORT_FORMATS", "json,csv,txt").split(",") if f.strip()]
+
+COLUMNS = ["cc", "last", "change_month", "min_year", "max_year", "avg_all_time", "days", "num_currencies"]
+
+# format -> fn(report) returning bytes; report = {"structured", "rows", "text"}
+WRITERS = {}
+
+
+def register_writer(fmt):
+    # Decorator to plug in an output format
+    def wrap(fn):
+        WRITERS[fmt] = fn
+        return fn
+    return wrap
+
+
+def report_rows(structured):
+    # One flat row per currency (the "general" section is repeated as num_currencies)
+    num = structured.get("general", {}).get("num_currencies")
+    rows = []
+    for key, section in structured.items():
+        if key == "general":
+            continue
+        rng = section.get("range_year", {})
+        rows.append({
+            "cc": key.upper(),
+            "last": section.get("last"),
+            "change_month": section.get("change_month"),
+            "min_year": rng.get(f"min_{key}"),
+            "max_year": rng.get(f"max_{key}"),
+            "avg_all_time": section.get("avg_all_time"),
+            "days": section.get("days"),
+            "num_currencies": num,
+        })
+    return rows
+
+
+@register_writer("json")
+def write_json(report):
+    return json.dumps(report["structured"], ensure_ascii=False, indent=2).encode("utf-8")
+
+
+@register_writer("csv")
+def write_csv(report):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLUMNS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(report["rows"])
+    return buf.getvalue().encode("utf-8")
+
+
+@register_writer("txt")
+def write_txt(report):
+    return report["text"].encode("utf-8")
+
+
+@register_writer("parquet")
+def write_parquet(report):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pylist(report["rows"], schema=pa.schema([
+        ("cc", pa.string()), ("last", pa.float64()), ("change_month", pa.float64()),
+        ("min_year", pa.float64()), ("max_year", pa.float64()), ("avg_all_time", pa.float64()),
+        ("days", pa.int64()), ("num_currencies", pa.int64()),
+    ]))
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+@register_writer("html")
+def write_html(report):
+    def cell(v):
+        if isinstance(v, float):
+            return f"{v:.4f}"
+        return html.escape("" if v is None else str(v))
+
+    head = "".join(f"<th>{c}</th>" for c in COLUMNS)
+    body = "".join("<tr>" + "".join(f"<td>{cell(r[c])}</td>" for c in COLUMNS) + "</tr>" for r in report["rows"])
+    text = html.escape(report["text"]).replace("\n", "<br>\n")
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Currency report</title></head><body>\n"
+            f"<p>{text}</p>\n<table border=\"1\"><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>\n"
+            f"</body></html>\n").encode("utf-8")
+
+
+def write_atomic(path, data):
+    # Temp file + rename, so readers (send_forecast, the API) never see a partial report
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return path
+
+
+def write_reports(structured, text, reports_dir, stem, formats=None):
+    # Render one multi-currency report per format; returns {format: path}
+    formats = formats or DEFAULT_FORMATS
+    unknown = [f for f in formats if f not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown report formats {unknown}, available: {sorted(WRITERS)}")
+    reports_dir = Path(reports_dir)
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    report = {"structured": structured, "rows": report_rows(structured), "text": text}
+    return {fmt: write_atomic(reports_dir / f"{stem}.{fmt}", WRITERS[fmt](report)) for fmt in formats}
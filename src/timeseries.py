@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sqlalchemy import text
+
+import metrics
+
+# Calendar the rate series are normalized to: "D" calendar days, "B" business days
+FREQ = os.getenv("CALENDAR_FREQ", "D")
+GAPS_PATH = Path(os.getenv("GAPS_PATH", "/opt/airflow/data/processed/gaps.parquet"))
+
+DATES_SQL = text("SELECT cc, exchangedate FROM exchange_rates ORDER BY cc, exchangedate")
+
+
+def _sorted(df):
+    df = df.assign(exchangedate=pd.to_datetime(df["exchangedate"]).dt.normalize())
+    return df.sort_values(["cc", "exchangedate"], ignore_index=True)
+
+
+def detect_gaps(df, freq=FREQ):
+    # Runs of missing grid dates between consecutive observations of each currency.
+    # Returns cc, gap_start, gap_end (first/last missing date) and missing (grid days).
+    cols = ["cc", "gap_start", "gap_end", "missing"]
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    df = _sorted(df[["cc", "exchangedate"]]).drop_duplicates()
+    prev = df.groupby("cc", sort=False)["exchangedate"].shift()
+    has_prev = prev.notna()
+    cur_d = df["exchangedate"][has_prev].to_numpy().astype("datetime64[D]")
+    prev_d = prev[has_prev].to_numpy().astype("datetime64[D]")
+    if freq == "B":
+        missing = np.busday_count(prev_d + 1, cur_d)
+    else:
+        missing = (cur_d - prev_d).astype(int) - 1
+    gaps = pd.DataFrame({
+        "cc": df["cc"][has_prev].to_numpy(),
+        "gap_start": prev_d + 1,
+        "gap_end": cur_d - 1,
+        "missing": missing,
+    })
+    gaps = gaps[gaps["missing"] > 0].reset_index(drop=True)
+    gaps["gap_start"] = pd.to_datetime(gaps["gap_start"])
+    gaps["gap_end"] = pd.to_datetime(gaps["gap_end"])
+    return gaps[cols]
+
+
+def fill_calendar(df, freq=FREQ, end=None, columns=("rate",)):
+    # Reindex every currency onto the calendar grid from its first observation to `end`
+    # (default: its last one) and forward-fill; "filled" marks the synthetic rows
+    if df.empty:
+        return df.assign(filled=pd.Series(dtype=bool))
+    df = _sorted(df[["cc", "exchangedate", *columns]]).drop_duplicates(["cc", "exchangedate"], keep="last")
+    if freq == "B":
+        # Off-grid (weekend, holiday) publications take effect on the next business day, where
+        # a real observation of that day still wins; a Saturday rate is not lost at the series end
+        days = df["exchangedate"].to_numpy().astype("datetime64[D]")
+        snapped = np.busday_offset(days, 0, roll="forward")
+        df = df.assign(exchangedate=pd.to_datetime(snapped), _on_grid=snapped == days)
+        df = (df.sort_values(["cc", "exchangedate", "_on_grid"], kind="stable")
+                .drop_duplicates(["cc", "exchangedate"], keep="last").drop(columns="_on_grid"))
+    bounds = df.groupby("cc", sort=False)["exchangedate"].agg(["min", "max"])
+    if end is not None:
+        bounds["max"] = bounds["max"].clip(lower=pd.Timestamp(end))
+
+    # One shared grid, masked per currency to its own [first, end] span
+    grid = pd.date_range(bounds["min"].min(), bounds["max"].max(), freq=freq)
+    cc_idx = np.repeat(np.arange(len(bounds)), len(grid))
+    dates = np.tile(grid.to_numpy(), len(bounds))
+    keep = (dates >= bounds["min"].to_numpy()[cc_idx]) & (dates <= bounds["max"].to_numpy()[cc_idx])
+    index = pd.MultiIndex.from_arrays([bounds.index.to_numpy()[cc_idx][keep], dates[keep]],
+                                      names=["cc", "exchangedate"])
+
+    obs = df.set_index(["cc", "exchangedate"])
+    out = obs.reindex(index)
+    out[list(columns)] = out[list(columns)].groupby(level="cc", sort=False).ffill()
+    out["filled"] = ~index.isin(obs.index)
+    return out.reset_index()
+
+
+def rolling(df, window="7D", column="rate", how="mean"):
+    # Time-based rolling statistic per currency in one grouped pass ("7D" = 7 calendar days,
+    # not 7 observations). df must be sorted by cc, exchangedate; result is aligned with df.
+    r = (df.set_index("exchangedate").groupby("cc", sort=False)[column]
+           .rolling(window, min_periods=1))
+    return pd.Series(getattr(r, how)().to_numpy(), index=df.index, name=f"{column}_{how}_{window}")
+
+
+def save_gaps(gaps, path=None):
+    # Gap metadata for monitoring (which currencies/dates were forward-filled)
+    path = Path(path or GAPS_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    gaps.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+@metrics.span("gaps")
+def record_gaps(engine, freq=FREQ, path=None):
+    # Detect missing dates of every stored currency and save them; returns the gaps frame
+    with engine.connect() as conn:
+        df = pd.read_sql(DATES_SQL, conn)
+    gaps = detect_gaps(df, freq)
+    out = save_gaps(gaps, path)
+    metrics.count("rows_written", len(gaps))
+    print(f"+ {len(gaps)} gaps ({int(gaps['missing'].sum()) if len(gaps) else 0} missing days) "
+          f"in {df['cc'].nunique()} currencies saved to {out}")
+    return gaps
@@ -1,43 +1,143 @@
-import pandas as pd
+import os
+import hashlib
 from pathlib import Path
 from datetime import datetime
-import glob
 import json
+import pyarrow as pa
+import metrics
+from dataset import write_rates, DATASET_DIR
+from validate import Validator
+from ingest import (list_raw_files, iter_records, iter_record_batches, batch_to_frame,
+                    BatchBuilder, SCHEMA, DEFAULT_BATCH_ROWS)
 
 RAW_DIR = Path("/opt/airflow/data/raw")
 PROCESSED_DIR = Path("/opt/airflow/data/processed")
+# Watermark of already processed raw snapshots (path -> sha256/mtime/size)
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
 
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+# Currencies kept by the pipeline (filtered while parsing)
+CURRENCIES = [c.strip().upper() for c in os.getenv("ETL_CURRENCIES", "USD,EUR").split(",") if c.strip()]
 
 def latest_raw_file():
     # Get latest raw file (sorted by folder name)
-    files = sorted(glob.glob(str(RAW_DIR / "*/response.json")))
+    files = list_raw_files(RAW_DIR)
     return files[-1] if files else None
 
-def transform(raw_path):
-    # Load raw JSON and convert to DataFrame
-    with open(raw_path, encoding="utf-8") as f:
-        data = json.load(f)
-    df = pd.DataFrame(data)
-    # Keep only useful columns
-    df = df[['cc', 'rate', 'txt', 'exchangedate']]
-    # Convert date from dd.MM.yyyy -> datetime
-    df['exchangedate'] = pd.to_datetime(df['exchangedate'], format='%d.%m.%Y')
-    # Add derived column
-    df['rate_per_100'] = df['rate'] * 100
-    # Keep only USD and EUR
-    df = df[df['cc'].isin(['USD', 'EUR'])]
-    return df
+def transform(raw_path, validator=None):
+    # Stream one raw snapshot into a DataFrame, keeping only the configured currencies.
+    # With a validator, rejected rows go to quarantine and only the clean ones are returned.
+    batches = list(iter_record_batches([raw_path], CURRENCIES))
+    table = pa.Table.from_batches(batches, schema=SCHEMA)
+    if validator is not None:
+        clean = validator(table)
+        table = pa.Table.from_batches([clean]) if clean is not None else SCHEMA.empty_table()
+    return batch_to_frame(table)
+
+def load_manifest(path=None):
+    path = path or MANIFEST_PATH
+    if not Path(path).exists():
+        return {"files": {}, "pending_load": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=None):
+    # Atomic write so a crash never corrupts the watermark
+    path = Path(path or MANIFEST_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def changed_files(paths, manifest):
+    # Return [(path, fingerprint)] for files that are new or whose content changed.
+    # Unchanged size+mtime skips hashing; a touched file with the same hash is not reprocessed.
+    changed = []
+    entries = manifest["files"]
+    for p in map(str, paths):
+        st = os.stat(p)
+        entry = entries.get(p)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            continue
+        fp = {"sha256": file_sha256(p), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        if entry and entry["sha256"] == fp["sha256"]:
+            entry.update(fp)
+            continue
+        changed.append((p, fp))
+    return changed
+
+def record_file(manifest, path, fingerprint, **extra):
+    manifest["files"][str(path)] = {
+        **fingerprint,
+        "processed_at": datetime.utcnow().isoformat(timespec="seconds"),
+        **extra,
+    }
+
+def snapshot_dates(raw_dates):
+    # dd.MM.yyyy strings of one snapshot -> sorted ISO dates, malformed ones skipped
+    parsed = set()
+    for d in raw_dates:
+        try:
+            parsed.add(datetime.strptime(d, "%d.%m.%Y").strftime("%Y-%m-%d"))
+        except (TypeError, ValueError):
+            continue
+    return sorted(parsed)
+
+@metrics.span("transform")
+def transform_incremental(batch_rows=DEFAULT_BATCH_ROWS, on_batch=None, validator=None):
+    # Stream only new or corrected raw snapshots into the rates dataset in fixed-size batches.
+    # Every batch is validated first (validate.py); rejected rows go to quarantine, not the dataset.
+    # on_batch(record_batch) is called for every written batch (in-memory handoff to load).
+    validator = validator or Validator()
+    manifest = load_manifest()
+    raw_files = list_raw_files(RAW_DIR)
+    todo = changed_files(raw_files, manifest)
+
+    pending = set(manifest.get("pending_load", []))
+    builder = BatchBuilder(batch_rows)
+    rows = 0
+
+    def write(batch):
+        nonlocal rows
+        if batch is not None:
+            batch = validator(batch)
+        if batch is not None:
+            # Later snapshots win; a correction supersedes the previously stored version
+            write_rates(batch_to_frame(batch))
+            rows += batch.num_rows
+            if on_batch is not None:
+                on_batch(batch)
+
+    for raw_f, fp in todo:
+        n, dates = 0, set()
+        for item in iter_records(raw_f, CURRENCIES):
+            n += 1
+            dates.add(item.get("exchangedate"))
+            write(builder.add(item))
+        dates = snapshot_dates(dates)
+        record_file(manifest, raw_f, fp, rows=n, dates=dates)
+        metrics.count("rows_read", n)
+        # Dates stay pending until the load stage consumes them (survives transform retries)
+        pending.update(dates)
+    write(builder.flush())
+    validator.summary()
+
+    manifest["pending_load"] = sorted(pending)
+    save_manifest(manifest)
+    metrics.count("files_processed", len(todo))
+    metrics.count("rows_written", rows)
+    print(f"+ Processed {len(todo)} new/changed of {len(raw_files)} raw snapshots ({rows} rows) into {DATASET_DIR}")
+    return rows
 
 if __name__ == "__main__":
-    raw_f = latest_raw_file()
-    if not raw_f:
+    if not latest_raw_file():
         raise SystemExit("No raw file found. Run extract first.")
 
-    df = transform(raw_f)
-
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    out_dir = PROCESSED_DIR / today
-    out_dir.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(out_dir / "data.parquet", index=False)
-    print("+ Processed data saved to", out_dir / "data.parquet")
+    transform_incremental()
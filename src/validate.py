@@ -0,0 +1,283 @@
+import os
+import time
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import date, datetime, timedelta
+
+import metrics
+from dataset import scan_rates
+from ingest import SCHEMA
+
+QUARANTINE_DIR = Path(os.getenv("QUARANTINE_DIR", "/opt/airflow/data/processed/quarantine"))
+# Largest accepted day-over-day move (0.2 = 20%); 0 disables the check
+MAX_CHANGE = float(os.getenv("VALIDATE_MAX_CHANGE", "0.2"))
+# Observations further apart than this are not compared (long gaps, start of a series)
+MAX_GAP_DAYS = int(os.getenv("VALIDATE_MAX_GAP_DAYS", "10"))
+
+# Hryvnia rates start in 1996; NBU publishes up to a few days ahead (Friday sets Monday's rate)
+MIN_DATE = date(1996, 1, 1)
+MAX_DAYS_AHEAD = 7
+EPOCH = date(1970, 1, 1)
+
+QUARANTINE_SCHEMA = pa.schema(list(SCHEMA) + [
+    ("reason", pa.string()),
+    ("quarantined_at", pa.timestamp("us")),
+])
+
+
+def conform(table):
+    # Schema/type check: the SCHEMA columns, cast where the types are compatible
+    missing = [f.name for f in SCHEMA if f.name not in table.column_names]
+    if missing:
+        raise ValueError(f"Batch is missing columns {missing}")
+    try:
+        return table.select(SCHEMA.names).cast(SCHEMA)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Batch does not match the rates schema: {e}") from e
+
+
+def _days(arr, null=-1):
+    # date32 -> days since epoch as int64, nulls as `null`
+    return pc.fill_null(pc.cast(arr, pa.int32()), null).to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def _floats(arr):
+    return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def _stored_codes(stored_cc, values):
+    # Positions of stored currencies in the batch dictionary `values` (-1: not in the batch);
+    # dictionary-encoded partition columns map through one unified dictionary
+    if stored_cc.num_chunks == 0:
+        return np.array([], np.int64)
+    if pa.types.is_dictionary(stored_cc.type):
+        stored_cc = stored_cc.unify_dictionaries()
+        lookup = pc.fill_null(pc.index_in(stored_cc.chunk(0).dictionary, value_set=values), -1).to_numpy()
+        indices = pa.chunked_array([c.indices for c in stored_cc.chunks]).to_numpy()
+        return lookup[indices]
+    return pc.fill_null(pc.index_in(stored_cc, value_set=values), -1).to_numpy()
+
+
+def stored_rates(table, max_gap_days=MAX_GAP_DAYS, root=None):
+    # Stored rows that can precede the batch: its currencies, from max_gap_days before its first date
+    valid = pc.drop_null(table["exchangedate"])
+    if len(valid) == 0:
+        return None
+    bounds = pc.min_max(valid).as_py()
+    ccs = pc.unique(pc.drop_null(table["cc"])).to_pylist()
+    return scan_rates(ccs, start=bounds["min"] - timedelta(days=max_gap_days), end=bounds["max"],
+                      columns=["rate"], root=root)
+
+
+def _jumps(codes, values, days, rate, keep, stored, max_change, max_gap_days):
+    # Day-over-day check for the rows in `keep`, against the last accepted observation of the
+    # same currency in the batch or in the store. One sort over both and a vectorized compare
+    # with the previous row; only the runs after a flagged row are re-walked against the last
+    # accepted one, so a single bad print does not drag its neighbours into quarantine.
+    rows = np.flatnonzero(keep)
+    if stored is None or stored.num_rows == 0:
+        stored = pa.table({"cc": pa.array([], pa.string()), "exchangedate": pa.array([], pa.date32()),
+                           "rate": pa.array([], pa.float64()), "ingested_at": pa.array([], pa.timestamp("us"))})
+    n_stored = stored.num_rows
+    codes = np.concatenate([_stored_codes(stored["cc"], values), codes[rows]])
+    all_days = np.concatenate([_days(stored["exchangedate"]), days[rows]])
+    all_rate = np.concatenate([_floats(stored["rate"]), rate[rows]])
+    src = np.concatenate([np.full(n_stored, -1), rows])
+    # Versions of a key sort oldest to newest; batch rows count as the newest of all
+    ingested = np.concatenate([stored["ingested_at"].to_numpy(zero_copy_only=False).astype("datetime64[us]"),
+                               np.full(len(rows), np.datetime64("9999-01-01", "us"))])
+
+    order = np.lexsort((ingested, all_days, codes))
+    codes, all_days, all_rate, src = codes[order], all_days[order], all_rate[order], src[order]
+    # Keep only the newest version of each key: stored versions of keys in the batch are
+    # being replaced and superseded stored versions are not "previous" either
+    last = np.ones(len(src), bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (all_days[1:] != all_days[:-1])
+    codes, all_days, all_rate, src = codes[last], all_days[last], all_rate[last], src[last]
+
+    def moved(lag):
+        # |rate / rate[i - lag] - 1| > max_change where both are the same currency within max_gap_days
+        flag = np.zeros(len(src), bool)
+        if len(src) > lag:
+            same = (codes[lag:] == codes[:-lag]) & (all_days[lag:] - all_days[:-lag] <= max_gap_days)
+            flag[lag:] = same & (np.abs(all_rate[lag:] / all_rate[:-lag] - 1) > max_change)
+        return flag & (src >= 0)
+
+    flagged = moved(1)
+    walked = -1
+    for i in np.flatnonzero(flagged):
+        if i <= walked:
+            continue
+        # Row i - 1 is accepted; rows after i are compared with it until one is accepted again
+        anchor, j = i - 1, i + 1
+        while j < len(src) and src[j] >= 0 and codes[j] == codes[anchor]:
+            if all_days[j] - all_days[anchor] > max_gap_days:
+                flagged[j] = False
+                break
+            flagged[j] = abs(all_rate[j] / all_rate[anchor] - 1) > max_change
+            if not flagged[j]:
+                break
+            j += 1
+        walked = j
+
+    out = np.zeros(len(keep), bool)
+    out[src[flagged]] = True
+    return out
+
+
+def validate(table, stored=None, max_change=MAX_CHANGE, max_gap_days=MAX_GAP_DAYS, today=None):
+    # One vectorized pass over a batch: schema/type, ranges, (cc, exchangedate) uniqueness and
+    # day-over-day moves. Returns (clean table, quarantined rows with a ";"-joined reason).
+    # stored: scan of previously stored rates (default: read from the dataset).
+    table = conform(table if isinstance(table, pa.Table) else pa.Table.from_batches([table]))
+    n = table.num_rows
+    if n == 0:
+        return table, QUARANTINE_SCHEMA.empty_table()
+
+    encoded = pc.dictionary_encode(pc.fill_null(table["cc"], "")).combine_chunks()
+    codes = encoded.indices.to_numpy()
+    rate = _floats(table["rate"])
+    per_100 = _floats(table["rate_per_100"])
+    days = _days(table["exchangedate"])
+    today = today or datetime.utcnow().date()
+
+    checks = {}
+    checks["bad_cc"] = ~pc.fill_null(pc.match_substring_regex(table["cc"], r"^[A-Z]{3}$"), False).to_numpy(
+        zero_copy_only=False)
+    checks["bad_rate"] = ~(np.isfinite(rate) & (rate > 0))
+    checks["bad_rate_per_100"] = ~checks["bad_rate"] & ~np.isclose(per_100, rate * 100, rtol=1e-9, atol=1e-9)
+    checks["bad_date"] = table["exchangedate"].is_null().to_numpy(zero_copy_only=False)
+    checks["date_out_of_range"] = ~checks["bad_date"] & (
+        (days < (MIN_DATE - EPOCH).days) | (days > (today + timedelta(days=MAX_DAYS_AHEAD) - EPOCH).days))
+
+    # Duplicate (cc, exchangedate): the last occurrence (latest snapshot) is kept
+    order = np.lexsort((np.arange(n), days, codes))
+    dup = np.zeros(n, bool)
+    dup[order[:-1]] = (codes[order][1:] == codes[order][:-1]) & (days[order][1:] == days[order][:-1])
+    checks["duplicate"] = dup & ~checks["bad_date"]
+
+    keep = ~np.any(np.vstack(list(checks.values())), axis=0)
+    if max_change > 0 and keep.any():
+        if stored is None:
+            stored = stored_rates(table.filter(pa.array(keep)), max_gap_days)
+        checks["jump"] = _jumps(codes, encoded.dictionary, days, rate, keep, stored, max_change, max_gap_days)
+
+    masks = np.vstack(list(checks.values()))
+    bad = masks.any(axis=0)
+    if not bad.any():
+        return table, QUARANTINE_SCHEMA.empty_table()
+
+    reasons = np.full(int(bad.sum()), "", dtype=object)
+    for name, mask in checks.items():
+        reasons = reasons + np.where(mask[bad], name + ";", "")
+    quarantined = table.filter(pa.array(bad))
+    quarantined = quarantined.append_column("reason", pa.array([r[:-1] for r in reasons], pa.string()))
+    quarantined = quarantined.append_column(
+        "quarantined_at", pa.array(np.full(len(quarantined), np.datetime64(datetime.utcnow(), "us"))))
+    return table.filter(pa.array(~bad)), quarantined
+
+
+def save_quarantine(quarantined, qdir=None):
+    # One part file per write, renamed into place
+    if quarantined.num_rows == 0:
+        return None
+    qdir = Path(qdir or QUARANTINE_DIR)
+    qdir.mkdir(parents=True, exist_ok=True)
+    path = qdir / f"part-{time.time_ns()}.parquet"
+    tmp = qdir / f".{path.name}.tmp"
+    pq.write_table(quarantined.cast(QUARANTINE_SCHEMA), tmp)
+    os.replace(tmp, path)
+    return path
+
+
+class Validator:
+    # Batch hook for transform: validates, writes bad rows to QUARANTINE_DIR, returns the clean batch
+    def __init__(self, qdir=None, max_change=MAX_CHANGE):
+        self.qdir = qdir
+        self.max_change = max_change
+        self.rows = 0
+        self.quarantined = 0
+        self.seconds = 0.0
+
+    def __call__(self, batch):
+        started = time.perf_counter()
+        clean, bad = validate(batch, max_change=self.max_change)
+        self.seconds += time.perf_counter() - started
+        self.rows += batch.num_rows
+        if bad.num_rows:
+            path = save_quarantine(bad, self.qdir)
+            self.quarantined += bad.num_rows
+            for row in pc.value_counts(bad["reason"]).to_pylist():
+                metrics.count("rows_quarantined", row["counts"], reason=row["values"])
+            print(f"# Quarantined {bad.num_rows} rows to {path}")
+        return clean.combine_chunks().to_batches()[0] if clean.num_rows else None
+
+    def summary(self):
+        print(f"+ Validated {self.rows} rows in {self.seconds * 1000:.1f} ms, {self.quarantined} quarantined")
+
+
+def read_quarantine(qdir=None):
+    qdir = Path(qdir or QUARANTINE_DIR)
+    files = sorted(qdir.glob("part-*.parquet"))
+    if not files:
+        return QUARANTINE_SCHEMA.empty_table(), files
+    return pa.concat_tables([pq.read_table(f).cast(QUARANTINE_SCHEMA) for f in files]), files
+
+
+def release(cc=None, start=None, end=None, qdir=None):
+    # Accept quarantined rows whose only problem was a day-over-day jump (e.g. a devaluation):
+    # write them to the dataset, mark their dates pending for load and drop them from quarantine
+    from dataset import write_rates
+    from ingest import batch_to_frame
+    from transform import load_manifest, save_manifest
+
+    table, files = read_quarantine(qdir)
+    mask = pc.equal(table["reason"], "jump")
+    if cc:
+        mask = pc.and_(mask, pc.equal(table["cc"], cc.upper()))
+    if start:
+        mask = pc.and_(mask, pc.greater_equal(table["exchangedate"], pa.scalar(start, pa.date32())))
+    if end:
+        mask = pc.and_(mask, pc.less_equal(table["exchangedate"], pa.scalar(end, pa.date32())))
+    mask = pc.fill_null(mask, False)
+    released = table.filter(mask)
+    if released.num_rows == 0:
+        print("+ Nothing to release")
+        return 0
+
+    write_rates(batch_to_frame(released.select(SCHEMA.names)))
+    manifest = load_manifest()
+    dates = {d.isoformat() for d in released["exchangedate"].to_pylist()}
+    manifest["pending_load"] = sorted(set(manifest.get("pending_load", [])) | dates)
+    save_manifest(manifest)
+
+    # Rewrite the remaining quarantine, then drop the old files
+    save_quarantine(table.filter(pc.invert(mask)), qdir)
+    for f in files:
+        f.unlink()
+    print(f"+ Released {released.num_rows} rows; run load to store them")
+    return released.num_rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show or release quarantined rates")
+    parser.add_argument("action", nargs="?", choices=["show", "release"], default="show")
+    parser.add_argument("--cc")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.action == "release":
+        release(args.cc, args.start, args.end)
+    else:
+        table, _ = read_quarantine()
+        for row in table.group_by("reason").aggregate([("cc", "count")]).to_pylist():
+            print(f"{row['reason']}: {row['cc_count']}")
+        print(f"+ {table.num_rows} quarantined rows in {QUARANTINE_DIR}")
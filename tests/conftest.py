@@ -0,0 +1,73 @@
+import sys
+import json
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Make src/ importable like the scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+
+class StubServer:
+    # Local HTTP server for NBU / Bot API stand-ins: every request is recorded and answered
+    # by handler(request) -> (status, headers, body); body may be bytes, str or JSON data
+    def __init__(self):
+        self.requests = []
+        self.handler = lambda request: (404, {}, b"")
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = {
+                    "method": self.command,
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "body": self.rfile.read(length) if length else b"",
+                }
+                with stub.lock:
+                    stub.requests.append(request)
+                    status, headers, body = stub.handler(request)
+                if not isinstance(body, (bytes, str)):
+                    body = json.dumps(body)
+                    headers = {"Content-Type": "application/json", **headers}
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_files(monkeypatch):
+    # Counters stay in memory: no .prom textfile or JSON log lines from the code under test
+    import metrics
+
+    monkeypatch.setattr(metrics, "TEXTFILE", "")
+    monkeypatch.setattr(metrics, "JSON_LOG", "")
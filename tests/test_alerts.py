@@ -0,0 +1,79 @@
+import pytest
+
+from alerts import parse_alert, AlertIndex
+
+
+@pytest.mark.parametrize("args, expected", [
+    (["USD", ">", "42.5"], ("USD", "above", 42.5)),
+    (["usd>42,5"], ("USD", "above", 42.5)),
+    (["EUR", "<", "40"], ("EUR", "below", 40.0)),
+    (["EUR", "move", "1%"], ("EUR", "move", 1.0)),
+    (["EUR", "1.5%"], ("EUR", "move", 1.5)),
+    (["EUR", "move", "100"], ("EUR", "move", 100.0)),
+])
+def test_parse_alert(args, expected):
+    assert parse_alert(args) == expected
+
+
+@pytest.mark.parametrize("args", [
+    ["USD"],
+    ["USD", "=", "42"],
+    ["US", ">", "42"],
+    ["USD", ">", "abc"],
+    ["USD", ">", "0"],
+    ["USD", ">", "-1"],
+    ["USD", ">", "nan"],
+    ["USD", ">", "inf"],
+    ["USD", ">", "1e12"],
+    ["USD", ">", "1e300"],
+    ["EUR", "move", "150%"],
+    ["EUR", "1000%"],
+])
+def test_parse_alert_rejects(args):
+    with pytest.raises(ValueError):
+        parse_alert(args)
+
+
+def alert(id, kind, threshold, cc="USD"):
+    return {"id": id, "chat_id": 100 + id, "cc": cc, "kind": kind, "threshold": threshold}
+
+
+INDEX = AlertIndex([
+    alert(1, "above", 41.0), alert(2, "above", 42.0), alert(3, "above", 43.0),
+    alert(4, "below", 40.0), alert(5, "below", 41.0), alert(6, "below", 42.0),
+    alert(7, "move", 1.0), alert(8, "move", 2.5),
+    alert(9, "above", 41.5, cc="EUR"),
+])
+
+
+def fired(*args, **kwargs):
+    return sorted(a["id"] for a, _ in INDEX.triggered(*args, **kwargs))
+
+
+def test_rise_fires_above_alerts_crossed_since_base_rate():
+    # 41.2 -> 42.5 crosses 42 (41 was already passed before the load); a rate equal to a
+    # threshold is not above it yet
+    assert fired("USD", 42.5, base_rate=41.2) == [2]
+    assert fired("USD", 42.5, base_rate=41.0) == [1, 2]
+    assert fired("USD", 43.0, base_rate=40.0) == [1, 2]
+
+
+def test_fall_fires_below_alerts_crossed_since_base_rate():
+    # 42.0 -> 40.5 falls below 42 and 41; a rate equal to a threshold is not below it
+    assert fired("USD", 40.5, base_rate=42.0) == [5, 6]
+    assert fired("USD", 40.0, base_rate=40.5) == []
+
+
+def test_no_base_rate_fires_no_crossings():
+    assert fired("USD", 50.0) == []
+
+
+def test_move_compares_with_prev_rate_in_both_directions():
+    assert fired("USD", 41.5, prev_rate=41.0) == [7]
+    assert fired("USD", 39.9, prev_rate=41.0) == [7, 8]
+    assert fired("USD", 41.1, prev_rate=41.0) == []
+
+
+def test_alerts_of_other_currencies_do_not_fire():
+    assert fired("EUR", 42.0, base_rate=41.0) == [9]
+    assert fired("PLN", 42.0, prev_rate=10.0, base_rate=1.0) == []
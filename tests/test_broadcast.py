@@ -0,0 +1,120 @@
+import json
+import time
+import asyncio
+
+import broadcast
+from broadcast import Broadcaster
+
+TOKEN = "123:test"
+
+
+class FakeBotAPI:
+    # Bot API stand-in: uploads get new file_ids, everything else succeeds unless `fail` says otherwise
+    def __init__(self):
+        self.file_ids = 0
+        # [(method, status, body)] answered once each, in order, before the normal replies
+        self.fail = []
+
+    def _photo(self):
+        self.file_ids += 1
+        return {"photo": [{"file_id": f"thumb{self.file_ids}"}, {"file_id": f"file{self.file_ids}"}]}
+
+    def __call__(self, request):
+        method = request["path"].rsplit("/", 1)[-1]
+        for i, (name, status, body) in enumerate(self.fail):
+            if name == method:
+                del self.fail[i]
+                return status, {}, body
+        if request["headers"].get("Content-Type", "").startswith("multipart/"):
+            n = request["body"].count(b"filename=")
+            result = self._photo() if method == "sendPhoto" else [self._photo() for _ in range(n)]
+        else:
+            data = json.loads(request["body"])
+            if method == "sendMediaGroup":
+                result = [{"photo": [{"file_id": m["media"]}]} for m in data["media"]]
+            else:
+                result = {"message_id": 1, "chat": {"id": data["chat_id"]}}
+        return 200, {}, {"ok": True, "result": result}
+
+
+def bot(stub_server):
+    api = FakeBotAPI()
+    stub_server.handler = api
+    return api
+
+
+def calls(stub_server, method):
+    return [r for r in stub_server.requests if r["path"].endswith(f"/{method}")]
+
+
+def run(coro_fn, stub_server, **kwargs):
+    async def main():
+        async with Broadcaster(TOKEN, api_base=stub_server.url, **kwargs) as b:
+            return await coro_fn(b)
+    return asyncio.run(main())
+
+
+def test_photos_uploaded_once_and_reused_by_file_id(stub_server, tmp_path):
+    bot(stub_server)
+    photos = []
+    for i in range(12):
+        path = tmp_path / f"forecast_{i}.png"
+        path.write_bytes(b"\x89PNG fake " + bytes([i]))
+        photos.append(path)
+
+    result = run(lambda b: b.broadcast([1, 2, 3], photos, "report"), stub_server)
+
+    assert sorted(result["sent"]) == [1, 2, 3]
+    uploads = [r for r in stub_server.requests if r["headers"].get("Content-Type", "").startswith("multipart/")]
+    # 12 charts: albums of 10 + 2, uploaded through the first chat only
+    assert len(uploads) == 2
+    albums = [json.loads(r["body"]) for r in calls(stub_server, "sendMediaGroup") if r not in uploads]
+    assert len(albums) == 4
+    for album in albums:
+        assert all(m["media"].startswith("file") for m in album["media"])
+    sent_ids = [[m["media"] for m in a["media"]] for a in albums if a["chat_id"] == 2]
+    assert sent_ids == [[f"file{i}" for i in range(1, 11)], ["file11", "file12"]]
+    assert len(calls(stub_server, "sendMessage")) == 3
+
+
+def test_token_bucket_paces_requests(stub_server):
+    bot(stub_server)
+    started = time.monotonic()
+    result = run(lambda b: b.send_texts({chat: "hi" for chat in range(20)}), stub_server, rate=10)
+    elapsed = time.monotonic() - started
+
+    assert len(result["sent"]) == 20
+    # A full bucket of 10, then 10 more at 10/s
+    assert elapsed >= 0.9
+
+
+def test_retry_after_pauses_and_resends(stub_server):
+    api = bot(stub_server)
+    api.fail = [("sendMessage", 429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": 1}})]
+    started = time.monotonic()
+    result = run(lambda b: b.send_texts({1: "hi"}), stub_server)
+
+    assert result["sent"] == [1]
+    assert len(calls(stub_server, "sendMessage")) == 2
+    assert time.monotonic() - started >= 1
+
+
+def test_non_json_error_page_is_retried(stub_server, monkeypatch):
+    api = bot(stub_server)
+    api.fail = [("sendMessage", 502, "<html><body>502 Bad Gateway</body></html>")]
+    monkeypatch.setattr(broadcast.random, "uniform", lambda a, b: 0)
+
+    result = run(lambda b: b.send_texts({1: "hi"}), stub_server)
+
+    assert result["sent"] == [1]
+    assert len(calls(stub_server, "sendMessage")) == 2
+
+
+def test_blocked_chats_are_reported(stub_server):
+    api = bot(stub_server)
+    api.fail = [("sendMessage", 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked"})]
+
+    result = run(lambda b: b.send_texts({7: "hi"}), stub_server)
+
+    assert result["sent"] == [] and result["blocked"] == [7]
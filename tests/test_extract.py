@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+import requests
+
+import extract
+from http_cache import HttpCache
+
+RATES = [{"r030": 840, "txt": "Долар США", "rate": 41.25, "cc": "USD", "exchangedate": "16.10.2026"}]
+
+
+@pytest.fixture
+def nbu(stub_server, monkeypatch):
+    # fetch_nbu against the stub, with sleeps recorded instead of waited
+    sleeps = []
+    monkeypatch.setattr(extract, "NBU_URL", f"{stub_server.url}/exchange")
+    monkeypatch.setattr(extract.time, "sleep", sleeps.append)
+    stub_server.sleeps = sleeps
+    return stub_server
+
+
+def test_429_honors_retry_after_then_succeeds(nbu, tmp_path):
+    answers = iter([(429, {"Retry-After": "3"}, b"slow down"), (200, {}, RATES)])
+    nbu.handler = lambda request: next(answers)
+
+    assert extract.fetch_nbu(cache=HttpCache(tmp_path)) == RATES
+    assert len(nbu.requests) == 2
+    assert nbu.sleeps == [3.0]
+
+
+def test_retry_after_is_capped(nbu, tmp_path):
+    answers = iter([(429, {"Retry-After": "3600"}, b""), (200, {}, RATES)])
+    nbu.handler = lambda request: next(answers)
+
+    extract.fetch_nbu(cache=HttpCache(tmp_path))
+    assert nbu.sleeps == [extract.BACKOFF_CAP]
+
+
+def test_5xx_gives_up_after_retry_limit(nbu, tmp_path):
+    nbu.handler = lambda request: (503, {}, b"unavailable")
+
+    with pytest.raises(requests.HTTPError):
+        extract.fetch_nbu(retries=2, cache=HttpCache(tmp_path))
+    assert len(nbu.requests) == 3
+    assert len(nbu.sleeps) == 2
+    # Exponential backoff with full jitter stays under base * 2^attempt
+    assert all(0 <= s <= extract.BACKOFF_BASE * 2 ** i for i, s in enumerate(nbu.sleeps))
+
+
+def test_published_date_is_served_from_disk(nbu, tmp_path):
+    nbu.handler = lambda request: (200, {}, RATES)
+    cache = HttpCache(tmp_path)
+    day = date(2024, 7, 1)
+
+    assert extract.fetch_nbu(day, cache=cache) == RATES
+    assert extract.fetch_nbu(day, cache=cache) == RATES
+    assert len(nbu.requests) == 1
+    assert "date=20240701" in nbu.requests[0]["path"]
+
+
+def test_cache_none_bypasses_the_module_cache(nbu, tmp_path, monkeypatch):
+    nbu.handler = lambda request: (200, {}, RATES)
+    monkeypatch.setattr(extract, "CACHE", HttpCache(tmp_path))
+    day = date(2024, 7, 1)
+
+    extract.fetch_nbu(day)
+    extract.fetch_nbu(day)
+    assert len(nbu.requests) == 1
+
+    extract.fetch_nbu(day, cache=None)
+    assert len(nbu.requests) == 2
+    assert "If-None-Match" not in nbu.requests[1]["headers"]
@@ -0,0 +1,52 @@
+import extract
+from http_cache import HttpCache
+
+RATES = [{"r030": 978, "txt": "Євро", "rate": 48.1, "cc": "EUR", "exchangedate": "16.10.2026"}]
+ETAG = '"v1"'
+
+
+def test_304_revalidates_cached_snapshot(stub_server, monkeypatch, tmp_path):
+    def handler(request):
+        if request["headers"].get("If-None-Match") == ETAG:
+            return 304, {"ETag": ETAG}, b""
+        return 200, {"ETag": ETAG, "Last-Modified": "Fri, 16 Oct 2026 10:00:00 GMT"}, RATES
+
+    stub_server.handler = handler
+    monkeypatch.setattr(extract, "NBU_URL", f"{stub_server.url}/exchange")
+    # ttl=0: today's snapshot is always revalidated
+    cache = HttpCache(tmp_path, ttl=0)
+
+    assert extract.fetch_nbu(cache=cache) == RATES
+    url = extract.nbu_url()
+    checked_at = cache.get(url)["meta"]["checked_at"]
+
+    assert extract.fetch_nbu(cache=cache) == RATES
+    first, second = stub_server.requests
+    assert "If-None-Match" not in first["headers"]
+    assert second["headers"]["If-None-Match"] == ETAG
+    assert second["headers"]["If-Modified-Since"] == "Fri, 16 Oct 2026 10:00:00 GMT"
+    entry = cache.get(url)
+    assert entry["meta"]["checked_at"] >= checked_at
+    assert not entry["meta"]["immutable"]
+
+
+def test_changed_snapshot_replaces_cache_entry(stub_server, monkeypatch, tmp_path):
+    updated = [dict(RATES[0], rate=48.3)]
+    answers = iter([(200, {"ETag": ETAG}, RATES), (200, {"ETag": '"v2"'}, updated)])
+    stub_server.handler = lambda request: next(answers)
+    monkeypatch.setattr(extract, "NBU_URL", f"{stub_server.url}/exchange")
+    cache = HttpCache(tmp_path, ttl=0)
+
+    extract.fetch_nbu(cache=cache)
+    assert extract.fetch_nbu(cache=cache) == updated
+    assert cache.get(extract.nbu_url())["meta"]["etag"] == '"v2"'
+
+
+def test_fresh_entry_skips_the_request(stub_server, monkeypatch, tmp_path):
+    stub_server.handler = lambda request: (200, {"ETag": ETAG}, RATES)
+    monkeypatch.setattr(extract, "NBU_URL", f"{stub_server.url}/exchange")
+    cache = HttpCache(tmp_path, ttl=3600)
+
+    extract.fetch_nbu(cache=cache)
+    extract.fetch_nbu(cache=cache)
+    assert len(stub_server.requests) == 1
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pyarrow as pa
+
+import pipeline
+from ingest import SCHEMA
+
+
+def batch(rows):
+    return pa.RecordBatch.from_pylist(
+        [{"cc": "USD", "rate": 41.0, "txt": "Долар США", "exchangedate": date(2025, 1, 1), "rate_per_100": 4100.0}]
+        * rows, schema=SCHEMA)
+
+
+def fake_transform(sizes):
+    def transform_incremental(on_batch):
+        for rows in sizes:
+            on_batch(batch(rows))
+        return sum(sizes)
+    return transform_incremental
+
+
+def test_transform_hands_small_runs_to_load(monkeypatch):
+    monkeypatch.setattr(pipeline, "HANDOFF_ROWS", 10)
+    monkeypatch.setattr(pipeline, "transform_incremental", fake_transform([4, 6]))
+    ctx = pipeline.Context()
+    pipeline.run_transform(ctx)
+
+    assert ctx["rows"] == 10
+    assert ctx["table"].num_rows == 10
+
+
+def test_transform_drops_batches_past_the_bound(monkeypatch):
+    monkeypatch.setattr(pipeline, "HANDOFF_ROWS", 10)
+    monkeypatch.setattr(pipeline, "transform_incremental", fake_transform([4, 6, 1, 5]))
+    ctx = pipeline.Context()
+    pipeline.run_transform(ctx)
+
+    # load_pending falls back to the Parquet dataset
+    assert ctx["rows"] == 16
+    assert "table" not in ctx
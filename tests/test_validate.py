@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pytest
+
+import dataset
+import transform
+import validate
+
+TODAY = date(2025, 1, 31)
+
+
+@pytest.fixture(autouse=True)
+def data_dirs(tmp_path, monkeypatch):
+    # Dataset, manifest and quarantine under tmp_path
+    monkeypatch.setattr(dataset, "DATASET_DIR", tmp_path / "rates")
+    monkeypatch.setattr(transform, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(validate, "QUARANTINE_DIR", tmp_path / "quarantine")
+    return tmp_path
+
+
+def rates(rows, cc="USD"):
+    # [(date, rate), ...] -> a batch in the rates schema
+    return pa.table({
+        "cc": [cc] * len(rows),
+        "rate": [r for _, r in rows],
+        "txt": ["Долар США"] * len(rows),
+        "exchangedate": [d for d, _ in rows],
+        "rate_per_100": [r * 100 for _, r in rows],
+    }, schema=validate.SCHEMA)
+
+
+def daily(values, start=date(2025, 1, 1)):
+    return [(start + timedelta(days=i), v) for i, v in enumerate(values)]
+
+
+def stored(rows, cc="USD", ingested_at=datetime(2025, 1, 1)):
+    return pa.table({
+        "cc": [cc] * len(rows),
+        "exchangedate": pa.array([d for d, _ in rows], pa.date32()),
+        "rate": [r for _, r in rows],
+        "ingested_at": pa.array([ingested_at] * len(rows), pa.timestamp("us")),
+    })
+
+
+def flagged(quarantined, reason="jump"):
+    return [r["exchangedate"] for r in quarantined.to_pylist() if reason in r["reason"].split(";")]
+
+
+def test_spike_then_recovery_flags_only_the_spike():
+    clean, bad = validate.validate(rates(daily([40, 41, 60, 41.5, 41.6])), today=TODAY)
+
+    assert flagged(bad) == [date(2025, 1, 3)]
+    assert clean.num_rows == 4
+
+
+def test_level_shift_stays_flagged():
+    # A devaluation: every row after the step is far from the last accepted rate
+    clean, bad = validate.validate(rates(daily([40, 41, 55, 55.5, 56])), today=TODAY)
+
+    assert flagged(bad) == [date(2025, 1, 3), date(2025, 1, 4), date(2025, 1, 5)]
+    assert clean.num_rows == 2
+
+
+def test_duplicates_keep_the_last_occurrence():
+    batch = rates([(date(2025, 1, 2), 41.0), (date(2025, 1, 2), 41.2), (date(2025, 1, 3), 41.3)])
+    clean, bad = validate.validate(batch, today=TODAY)
+
+    assert flagged(bad, "duplicate") == [date(2025, 1, 2)]
+    assert bad["rate"].to_pylist() == [41.0]
+    assert clean["rate"].to_pylist() == [41.2, 41.3]
+
+
+def test_first_row_is_compared_with_stored_rates():
+    batch = rates([(date(2025, 1, 10), 60.0), (date(2025, 1, 11), 41.1)])
+    clean, bad = validate.validate(batch, stored=stored([(date(2025, 1, 9), 41.0)]), today=TODAY)
+
+    assert flagged(bad) == [date(2025, 1, 10)]
+    assert clean["rate"].to_pylist() == [41.1]
+
+
+def test_newest_stored_version_is_the_previous_rate():
+    # A later correction of 2025-01-09 supersedes the stored 30.0
+    previous = pa.concat_tables([stored([(date(2025, 1, 9), 30.0)]),
+                                 stored([(date(2025, 1, 9), 41.0)], ingested_at=datetime(2025, 1, 2))])
+    _, bad = validate.validate(rates([(date(2025, 1, 10), 41.2)]), stored=previous, today=TODAY)
+
+    assert bad.num_rows == 0
+
+
+def test_max_gap_days_bounds_the_lookback():
+    previous = stored([(date(2025, 1, 1), 41.0)])
+    _, within = validate.validate(rates([(date(2025, 1, 11), 60.0)]), stored=previous,
+                                  max_gap_days=10, today=TODAY)
+    _, beyond = validate.validate(rates([(date(2025, 1, 12), 60.0)]), stored=previous,
+                                  max_gap_days=10, today=TODAY)
+
+    assert flagged(within) == [date(2025, 1, 11)]
+    assert beyond.num_rows == 0
+
+
+def test_validator_writes_quarantine(tmp_path):
+    validator = validate.Validator(qdir=tmp_path / "q")
+    clean = validator(rates(daily([40, 41, 60, 41.5])).to_batches()[0])
+
+    assert clean.num_rows == 3
+    table, files = validate.read_quarantine(tmp_path / "q")
+    assert len(files) == 1
+    assert table["reason"].to_pylist() == ["jump"]
+    assert table["rate"].to_pylist() == [60.0]
+    assert validator.quarantined == 1
+
+
+def test_release_writes_jumps_and_marks_them_pending(tmp_path):
+    validator = validate.Validator()
+    batch = rates(daily([40, 41, 55, 55.5]))
+    bad_cc = rates([(date(2025, 1, 5), 41.0)], cc="usd")
+    validator(pa.concat_tables([batch, bad_cc]))
+
+    assert validate.release("usd") == 2
+
+    released = dataset.read_rates(["USD"])
+    assert sorted(released["rate"]) == [55.0, 55.5]
+    assert transform.load_manifest()["pending_load"] == ["2025-01-03", "2025-01-04"]
+    # Only the row with a non-jump reason is left in quarantine
+    remaining, files = validate.read_quarantine()
+    assert remaining["reason"].to_pylist() == ["bad_cc"]
+    assert len(files) == 1